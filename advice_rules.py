@@ -0,0 +1,321 @@
+import linecache
+import operator
+from collections import namedtuple
+from string import Formatter
+
+# -------------------------------------------------
+# DECLARATIVE RISK + ADVICE RULES
+# -------------------------------------------------
+# Single source of truth for every threshold used by /summary (env risk),
+# compute_practice_risk and generate_structured_advice. The tables are
+# compiled once at import into flat check lists and pre-parsed templates,
+# so evaluating a field is a few comparisons plus string assembly.
+#
+# A condition is (field, op, value). For sensor fields the value names an
+# entry in THRESHOLDS; for practice fields it is a lower-case literal
+# compared against the lower-cased input ("" when missing).
+#
+# Within a category the first rule whose conditions all hold wins; a rule
+# with no conditions is the category default.
+
+THRESHOLDS = {
+    "ph_min": 5.5,
+    "ph_max": 7.5,
+    "moisture_low": 30,
+    "moisture_moderate": 40,
+    "moisture_high": 50,
+    "temp_extreme": 40,
+    "temp_high": 35,
+    "temp_low": 10,
+    "humidity_low": 35,
+    "humidity_moderate": 50,
+    "humidity_high": 70,
+    "fungal_temp": 28,
+}
+
+SENSOR_FIELDS = ("avg_ph", "avg_temp", "avg_moisture", "avg_humidity")
+PRACTICE_FIELDS = ("crop", "irrigation", "fertilizer")
+
+# -------- Environmental Risk (0–100) --------
+ENV_RISK_RULES = {
+    "ph": [
+        ([("avg_ph", "<", "ph_min")], 25),
+        ([("avg_ph", ">", "ph_max")], 25),
+    ],
+    "moisture": [
+        ([("avg_moisture", "<", "moisture_low")], 25),
+        ([("avg_moisture", "<", "moisture_moderate")], 10),
+    ],
+    "temperature": [
+        ([("avg_temp", ">", "temp_extreme")], 25),
+        ([("avg_temp", ">", "temp_high")], 10),
+    ],
+    "humidity": [
+        ([("avg_humidity", "<", "humidity_low")], 25),
+        ([("avg_humidity", "<", "humidity_moderate")], 10),
+    ],
+}
+
+# -------- Practice Risk --------
+PRACTICE_RISK_RULES = {
+    "irrigation": [([("irrigation", "==", "daily")], 10)],
+    "fertilizer": [([("fertilizer", "==", "weekly")], 10)],
+    "crop": [([("crop", "==", "rice")], 5)],
+}
+
+# -------- Advice --------
+ADVICE_RULES = {
+    "ph": [
+        ("ph_acidic", [("avg_ph", "<", "ph_min")],
+         "⚠️ **Acidic Soil (pH {avg_ph})**: Apply agricultural lime "
+         "(calcium carbonate) at 2–4 tonnes/hectare to raise pH. "
+         "Retest after 4–6 weeks. Avoid ammonium-based fertilizers "
+         "which further acidify soil."),
+        ("ph_alkaline", [("avg_ph", ">", "ph_max")],
+         "⚠️ **Alkaline Soil (pH {avg_ph})**: Apply elemental sulfur "
+         "or gypsum at 1–2 tonnes/hectare. Incorporate organic matter "
+         "(composted manure, peat) to gradually lower pH. Avoid "
+         "over-liming."),
+        ("ph_optimal", [],
+         "✅ **Soil pH ({avg_ph})** is within the optimal range "
+         "({ph_min}–{ph_max}). Maintain current practices."),
+    ],
+    "moisture": [
+        ("moisture_low", [("avg_moisture", "<", "moisture_low"),
+                          ("irrigation", "!=", "daily")],
+         "⚠️ **Low Moisture ({avg_moisture}%)**: Increase irrigation "
+         "frequency. Consider drip irrigation for water efficiency. "
+         "Apply organic mulch (4–6 cm) to reduce evaporation."),
+        ("moisture_low_daily_irrigation", [("avg_moisture", "<", "moisture_low"),
+                                           ("irrigation", "==", "daily")],
+         "⚠️ **Low Moisture Despite Daily Irrigation ({avg_moisture}%)**: "
+         "Soil may have poor water retention. Add compost or "
+         "coco peat to improve structure. Check for drainage issues."),
+        ("moisture_over_irrigation", [("avg_moisture", ">", "moisture_high"),
+                                      ("irrigation", "==", "daily")],
+         "⚠️ **Over-Irrigation Detected (Moisture {avg_moisture}%, "
+         "Daily Irrigation)**: Reduce watering frequency to every "
+         "2–3 days. Over-watering leaches nutrients and promotes "
+         "root rot. Switch to scheduled drip irrigation."),
+        ("moisture_adequate", [],
+         "✅ **Soil Moisture ({avg_moisture}%)** is adequate. "
+         "Continue current irrigation schedule."),
+    ],
+    "temperature": [
+        ("temp_extreme_heat", [("avg_temp", ">", "temp_extreme")],
+         "🔥 **Extreme Heat ({avg_temp}°C)**: Apply straw mulch "
+         "(8–10 cm) immediately. Irrigate during early morning "
+         "or late evening. Consider shade netting for sensitive crops."),
+        ("temp_high", [("avg_temp", ">", "temp_high")],
+         "⚠️ **High Temperature ({avg_temp}°C)**: Monitor crop stress "
+         "closely. Increase organic mulch cover. Avoid fertilizer "
+         "application during peak heat to prevent root burn."),
+        ("temp_low", [("avg_temp", "<", "temp_low")],
+         "❄️ **Low Temperature ({avg_temp}°C)**: Risk of frost damage. "
+         "Use row covers or cold frames. Delay planting of warm-season "
+         "crops until soil warms above 15°C."),
+    ],
+    "humidity": [
+        ("humidity_low", [("avg_humidity", "<", "humidity_low")],
+         "⚠️ **Low Humidity ({avg_humidity}%)**: Increase mulching to "
+         "preserve soil moisture. Consider windbreaks to reduce "
+         "evapotranspiration. Mist irrigation may help in greenhouse "
+         "settings."),
+        ("humidity_fungal_risk", [("avg_humidity", ">", "humidity_high"),
+                                  ("avg_temp", ">", "fungal_temp")],
+         "🦠 **Fungal Disease Risk (Humidity {avg_humidity}%, "
+         "Temp {avg_temp}°C)**: Monitor for blight, mildew, and "
+         "rust. Ensure adequate plant spacing for airflow. "
+         "Apply preventive copper-based fungicide if symptoms appear."),
+    ],
+    "fertilizer": [
+        ("fertilizer_weekly", [("fertilizer", "==", "weekly")],
+         "⚠️ **Frequent Fertilization (Weekly)**: Risk of nutrient "
+         "buildup and salt stress. Adopt split nitrogen application — "
+         "apply 40% at planting, 30% at tillering, 30% at flowering. "
+         "Conduct soil nutrient tests every 3 months."),
+        ("fertilizer_none", [("fertilizer", "==", "none")],
+         "⚠️ **No Fertilizer Applied**: Soil nutrient depletion is "
+         "likely over time. Consider a balanced NPK application or "
+         "composted organic manure as a minimum baseline."),
+    ],
+    "crop": [
+        ("crop_rice", [("crop", "==", "rice")],
+         "🌾 **Rice Cultivation**: Maintain standing water depth of "
+         "2–5 cm during vegetative stage. Alternate wetting and drying "
+         "(AWD) technique saves 15–30% water with no yield loss."),
+    ],
+}
+
+OPS = {
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+    "==": operator.eq, "!=": operator.ne,
+}
+
+
+# -------------------------------------------------
+# COMPILATION (runs once at import)
+# -------------------------------------------------
+# The tables are turned into plain Python source — the same if/elif chains
+# one would write by hand — and compiled once, so there is no per-call rule
+# interpretation. Templates become literal/str() concatenations.
+#
+# Compiled rules are named tuples, so the generator (and batch_scoring)
+# reads fields by name; GENERATED_SOURCE is registered with linecache, so
+# tracebacks and pdb show the generated lines.
+
+Check = namedtuple("Check", "field op value")
+ScoredRule = namedtuple("ScoredRule", "checks points")
+AdviceRule = namedtuple("AdviceRule", "rule_id checks template")
+
+
+def compile_condition(field, op, value):
+    """(field, op, value) → Check with the threshold resolved."""
+    if op not in OPS:
+        raise ValueError(f"Unknown rule operator: {op}")
+    if field in SENSOR_FIELDS:
+        value = THRESHOLDS[value]
+    elif field not in PRACTICE_FIELDS:
+        raise ValueError(f"Unknown rule field: {field}")
+    return Check(field, op, value)
+
+
+def compile_template(text):
+    """Template → tuple of (literal, field-or-None). Thresholds are baked in."""
+    parts = []
+    literal = ""
+    for text_part, field, _, _ in Formatter().parse(text):
+        literal += text_part
+        if field is None:
+            continue
+        if field in THRESHOLDS:
+            literal += str(THRESHOLDS[field])
+        elif field in SENSOR_FIELDS:
+            parts.append((literal, field))
+            literal = ""
+        else:
+            raise ValueError(f"Unknown template field: {field}")
+    parts.append((literal, None))
+    return tuple(parts)
+
+
+def render_advice(parts, values):
+    """Render a compiled template with sensor values from `values`."""
+    return "".join(
+        literal + str(values[field]) if field else literal
+        for literal, field in parts
+    )
+
+
+def _compile_scored(table):
+    return tuple(
+        (category, tuple(
+            ScoredRule(tuple(compile_condition(*c) for c in conditions), points)
+            for conditions, points in rules))
+        for category, rules in table.items()
+    )
+
+
+COMPILED_ENV_RISK = _compile_scored(ENV_RISK_RULES)
+COMPILED_PRACTICE_RISK = _compile_scored(PRACTICE_RISK_RULES)
+COMPILED_ADVICE = tuple(
+    (category, tuple(
+        AdviceRule(rule_id, tuple(compile_condition(*c) for c in conditions),
+                   compile_template(text))
+        for rule_id, conditions, text in rules))
+    for category, rules in ADVICE_RULES.items()
+)
+TEMPLATES = {
+    rule.rule_id: rule.template
+    for _, rules in COMPILED_ADVICE
+    for rule in rules
+}
+
+_LOWER_PRACTICES = [
+    f"    {f} = {f}.lower() if {f} else \"\"" for f in PRACTICE_FIELDS
+]
+
+
+def _test(checks):
+    return " and ".join(f"{c.field} {c.op} {c.value!r}" for c in checks) or "True"
+
+
+def _chain(rules, action):
+    """if/elif lines for one first-match category (ScoredRule or AdviceRule)."""
+    lines = []
+    for i, rule in enumerate(rules):
+        if i and not rule.checks:
+            lines.append("    else:")
+        else:
+            lines.append(f"    {'if' if i == 0 else 'elif'} {_test(rule.checks)}:")
+        lines.append(f"        {action(rule)}")
+    return lines
+
+
+def _render_source(parts):
+    return " + ".join(
+        (f"{literal!r} + str({field})" if field else repr(literal))
+        for literal, field in parts
+    )
+
+
+def _build_source():
+    sensors, practices = ", ".join(SENSOR_FIELDS), ", ".join(PRACTICE_FIELDS)
+    src = [f"def compute_env_risk({sensors}):", "    risk = 0"]
+    for _, rules in COMPILED_ENV_RISK:
+        src += _chain(rules, lambda r: f"risk += {r.points}")
+    src += ["    return risk", ""]
+
+    src += [f"def compute_practice_risk({practices}):", *_LOWER_PRACTICES, "    risk = 0"]
+    for _, rules in COMPILED_PRACTICE_RISK:
+        src += _chain(rules, lambda r: f"risk += {r.points}")
+    src += ["    return risk", ""]
+
+    for name, action in (
+        ("advice_rule_hits", lambda r: f"out.append({r.rule_id!r})"),
+        ("generate_structured_advice", lambda r: f"out.append({_render_source(r.template)})"),
+    ):
+        src += [f"def {name}({sensors}, {practices}):", *_LOWER_PRACTICES, "    out = []"]
+        for _, rules in COMPILED_ADVICE:
+            src += _chain(rules, action)
+        src += ["    return out", ""]
+    return "\n".join(src)
+
+
+GENERATED_SOURCE = _build_source()
+GENERATED_FILENAME = "<advice_rules generated>"
+linecache.cache[GENERATED_FILENAME] = (
+    len(GENERATED_SOURCE), None, GENERATED_SOURCE.splitlines(True), GENERATED_FILENAME)
+_generated = {}
+exec(compile(GENERATED_SOURCE, GENERATED_FILENAME, "exec"), _generated)
+
+
+# -------------------------------------------------
+# EVALUATION
+# -------------------------------------------------
+def compute_env_risk(avg_ph, avg_temp, avg_moisture, avg_humidity):
+    """Environmental risk (0–100) from averaged sensor readings."""
+    return _generated["compute_env_risk"](avg_ph, avg_temp, avg_moisture, avg_humidity)
+
+
+def compute_practice_risk(crop, irrigation, fertilizer):
+    """Practice-based risk modifier. Fully deterministic."""
+    return _generated["compute_practice_risk"](crop, irrigation, fertilizer)
+
+
+def advice_rule_hits(avg_ph, avg_temp, avg_moisture, avg_humidity,
+                     crop, irrigation, fertilizer):
+    """Ids of the advice rules that fire, in report order."""
+    return _generated["advice_rule_hits"](
+        avg_ph, avg_temp, avg_moisture, avg_humidity, crop, irrigation, fertilizer)
+
+
+def generate_structured_advice(avg_ph, avg_temp, avg_moisture, avg_humidity,
+                               crop, irrigation, fertilizer):
+    """
+    Pure deterministic rules → list of actionable advice strings.
+    Works fully offline. No API dependency.
+    """
+    return _generated["generate_structured_advice"](
+        avg_ph, avg_temp, avg_moisture, avg_humidity, crop, irrigation, fertilizer)
@@ -0,0 +1,362 @@
+import math
+import time
+import sqlite3
+import threading
+from bisect import bisect_left
+
+from reading_store import SENSOR_KEYS
+
+# -------------------------------------------------
+# STANDING THRESHOLD ALERTS
+# -------------------------------------------------
+# Users and farms register rules such as "soil_moisture below 25 for 3
+# consecutive readings" or "soil_ph outside 5.5–7.5". Rules are checked as
+# readings are ingested, not when a report is requested.
+#
+# Each rule's trigger region is one or two intervals of its sensor's value.
+# Per (sensor key, device) the intervals are cut into elementary segments,
+# each holding the rules that cover it, so a reading finds the rules it
+# could trigger with one bisect per sensor key — however many rules exist.
+#
+# Streaks need no per-worker state: a rule fires when the newest
+# `consecutive` readings of the device's current test (the shared reading
+# ring) are all in its region and the reading before them was not. So an
+# excursion alerts once, and again only after it ends and recurs, or in a
+# new test.
+#
+# Fired alerts are appended to an outbox table that a notifier polls and
+# acknowledges. Rules and outbox live in SQLite (WAL), shared by every
+# worker; each worker rebuilds its index when the rule set changes.
+
+KINDS = ("below", "above", "outside", "inside")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    owner TEXT NOT NULL,
+    device_id TEXT,
+    sensor TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    low REAL,
+    high REAL,
+    consecutive INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alert_rules_owner ON alert_rules (owner, id);
+CREATE TABLE IF NOT EXISTS alert_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    rule_id INTEGER NOT NULL,
+    owner TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    sensor TEXT NOT NULL,
+    value REAL NOT NULL,
+    message TEXT NOT NULL,
+    delivered REAL
+);
+CREATE INDEX IF NOT EXISTS alert_outbox_owner ON alert_outbox (owner, id);
+CREATE INDEX IF NOT EXISTS alert_outbox_pending ON alert_outbox (id) WHERE delivered IS NULL;
+"""
+
+RULE_COLUMNS = "id, owner, device_id, sensor, kind, low, high, consecutive"
+OUTBOX_COLUMNS = "id, created, rule_id, owner, device_id, sensor, value, message, delivered"
+
+
+class AlertRule:
+    """One standing rule. `device_id` None applies it to every device."""
+
+    __slots__ = ("id", "owner", "device_id", "sensor", "kind", "low", "high", "consecutive")
+
+    def __init__(self, id, owner, device_id, sensor, kind, low, high, consecutive):
+        self.id = id
+        self.owner = owner
+        self.device_id = device_id
+        self.sensor = sensor
+        self.kind = kind
+        self.low = low
+        self.high = high
+        self.consecutive = consecutive
+
+    def intervals(self):
+        """Trigger region as (low, high) intervals; bounds are exact in matches()."""
+        if self.kind == "below":
+            return [(-math.inf, self.high)]
+        if self.kind == "above":
+            return [(self.low, math.inf)]
+        if self.kind == "inside":
+            return [(self.low, self.high)]
+        return [(-math.inf, self.low), (self.high, math.inf)]
+
+    def matches(self, value):
+        if self.kind == "below":
+            return value < self.high
+        if self.kind == "above":
+            return value > self.low
+        if self.kind == "inside":
+            return self.low <= value <= self.high
+        return value < self.low or value > self.high
+
+    def describe(self):
+        if self.kind == "below":
+            condition = f"below {self.high:g}"
+        elif self.kind == "above":
+            condition = f"above {self.low:g}"
+        else:
+            condition = f"{self.kind} {self.low:g}–{self.high:g}"
+        if self.consecutive > 1:
+            condition += f" for {self.consecutive} consecutive readings"
+        return f"{self.sensor} {condition}"
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class IntervalIndex:
+    """Rules whose trigger region may contain a value — one bisect per lookup."""
+
+    def __init__(self, rules):
+        spans = [(rule, low, high) for rule in rules for low, high in rule.intervals()]
+        points = sorted({p for _, low, high in spans for p in (low, high) if math.isfinite(p)})
+        # segments[k] covers (points[k-1], points[k]); at_point[i] covers points[i]
+        segments = [[] for _ in range(len(points) + 1)]
+        at_point = [[] for _ in points]
+        for rule, low, high in spans:
+            first = 0 if low == -math.inf else bisect_left(points, low) + 1
+            last = len(points) if high == math.inf else bisect_left(points, high)
+            for k in range(first, last + 1):
+                segments[k].append(rule)
+            for bound in (low, high):
+                if math.isfinite(bound):
+                    at_point[bisect_left(points, bound)].append(rule)
+        self.points = points
+        self.segments = [tuple(s) for s in segments]
+        # A value on a boundary may belong to either neighbouring segment
+        self.at_point = [
+            tuple(dict.fromkeys(segments[i] + segments[i + 1] + at_point[i]))
+            for i in range(len(points))
+        ]
+
+    def candidates(self, value):
+        i = bisect_left(self.points, value)
+        if i < len(self.points) and self.points[i] == value:
+            return self.at_point[i]
+        return self.segments[i]
+
+
+def _starts_streak(rule, readings):
+    """Newest `consecutive` readings all match and the one before them does not."""
+    n = rule.consecutive
+    if len(readings) < n:
+        return False
+    if not all(rule.matches(r[rule.sensor]) for r in readings[-n:]):
+        return False
+    return len(readings) == n or not rule.matches(readings[-n - 1][rule.sensor])
+
+
+def _to_alert(row):
+    return dict(zip(("id", "created", "rule_id", "owner", "device_id", "sensor",
+                     "value", "message", "delivered"), row))
+
+
+class AlertEngine:
+    """Rules and outbox in SQLite; one connection per thread.
+
+    `max_consecutive` is the longest streak a rule may ask for — the
+    number of readings the reading ring keeps per device.
+    """
+
+    def __init__(self, path, max_consecutive, refresh=1.0):
+        self.path = path
+        self.max_consecutive = max_consecutive
+        self.refresh = refresh
+        self._local = threading.local()
+        self._indexes = {}         # (sensor, device or None) -> IntervalIndex
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        db = self._db()
+        db.executescript(SCHEMA)
+        db.commit()
+        self._reload()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # ---------- rule index ----------
+    def _rule_version(self):
+        # Any insert raises MAX(id); deletes alone lower COUNT(*)
+        return self._db().execute("SELECT MAX(id), COUNT(*) FROM alert_rules").fetchone()
+
+    def _reload(self):
+        with self._lock:
+            version = self._rule_version()
+            rules = [AlertRule(*row) for row in self._db().execute(
+                f"SELECT {RULE_COLUMNS} FROM alert_rules")]
+            grouped = {}
+            for rule in rules:
+                grouped.setdefault((rule.sensor, rule.device_id), []).append(rule)
+            self._indexes = {key: IntervalIndex(group) for key, group in grouped.items()}
+            self._version = version
+            self._checked = time.monotonic()
+
+    def _refresh(self):
+        """Pick up rule changes made by other workers, at most every `refresh` s."""
+        now = time.monotonic()
+        if now - self._checked < self.refresh:
+            return
+        self._checked = now
+        if self._rule_version() != self._version:
+            self._reload()
+
+    # ---------- rules ----------
+    def add_rule(self, owner, sensor, kind, low=None, high=None, consecutive=1, device_id=None):
+        """Validate and store a rule. Raises ValueError on bad input."""
+        if sensor not in SENSOR_KEYS:
+            raise ValueError(f"sensor must be one of {', '.join(SENSOR_KEYS)}")
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+        low = float(low) if low is not None else None
+        high = float(high) if high is not None else None
+        if kind == "below":
+            if high is None:
+                raise ValueError("'below' needs a threshold")
+            low = None
+        elif kind == "above":
+            if low is None:
+                raise ValueError("'above' needs a threshold")
+            high = None
+        elif low is None or high is None or low > high:
+            raise ValueError(f"'{kind}' needs low <= high")
+        if not all(math.isfinite(v) for v in (low, high) if v is not None):
+            raise ValueError("thresholds must be finite numbers")
+        consecutive = int(consecutive)
+        if not 1 <= consecutive <= self.max_consecutive:
+            raise ValueError(f"consecutive must be between 1 and {self.max_consecutive}")
+
+        db = self._db()
+        with db:
+            cur = db.execute(
+                "INSERT INTO alert_rules (created, owner, device_id, sensor, kind, low, high, "
+                "consecutive) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), owner, device_id, sensor, kind, low, high, consecutive)
+            )
+        self._reload()
+        return AlertRule(cur.lastrowid, owner, device_id, sensor, kind, low, high, consecutive)
+
+    def rules(self, owner=None):
+        where, params = ("WHERE owner = ? ", (owner,)) if owner is not None else ("", ())
+        return [AlertRule(*row) for row in self._db().execute(
+            f"SELECT {RULE_COLUMNS} FROM alert_rules {where}ORDER BY id", params)]
+
+    def delete_rule(self, rule_id):
+        db = self._db()
+        with db:
+            deleted = db.execute("DELETE FROM alert_rules WHERE id = ?", (rule_id,)).rowcount
+        if deleted:
+            self._reload()
+        return bool(deleted)
+
+    # ---------- evaluation ----------
+    def active(self):
+        """True if any rule exists (after picking up other workers' changes)."""
+        self._refresh()
+        return bool(self._indexes)
+
+    def check(self, device, reading, history):
+        """Alerts `reading` fires. `history()` returns the device's readings of
+        the current test, oldest first, ending with `reading`; it is only
+        called when some rule's region contains a value."""
+        indexes = self._indexes
+        if not indexes:
+            return []
+        alerts, readings = [], None
+        for sensor in SENSOR_KEYS:
+            value = float(reading[sensor])
+            for index in (indexes.get((sensor, device)), indexes.get((sensor, None))):
+                if index is None:
+                    continue
+                for rule in index.candidates(value):
+                    if not rule.matches(value):
+                        continue
+                    if readings is None:
+                        readings = history()
+                    if _starts_streak(rule, readings):
+                        alerts.append((rule, device, value))
+        return alerts
+
+    def evaluate(self, device, readings, previous):
+        """Check newly stored `readings` (oldest first) and queue what fires.
+
+        `previous` holds the device's current-test readings from before
+        these were stored (the ring contents, oldest first). Returns the
+        queued alerts.
+        """
+        if not self.active():
+            return []
+        combined = []
+        depth = self.max_consecutive + 1   # a streak check looks no further back
+
+        def history_at(end):
+            if not combined:
+                combined.extend(previous)
+                combined.extend(readings)
+            return combined[max(0, end - depth):end]
+
+        fired = []
+        for position, reading in enumerate(readings):
+            end = len(previous) + position + 1
+            fired += self.check(device, reading, lambda end=end: history_at(end))
+        if not fired:
+            return []
+
+        now = time.time()
+        rows = [(now, rule.id, rule.owner, device, rule.sensor, value,
+                 f"{device}: {rule.describe()} (now {value:g})")
+                for rule, device, value in fired]
+        db = self._db()
+        with db:
+            db.executemany(
+                "INSERT INTO alert_outbox (created, rule_id, owner, device_id, sensor, "
+                "value, message) VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        return [{"rule_id": r[1], "owner": r[2], "device_id": r[3], "sensor": r[4],
+                 "value": r[5], "message": r[6]} for r in rows]
+
+    # ---------- outbox ----------
+    def outbox(self, owner=None, after=0, limit=100, pending=True):
+        """Alerts with id > after, oldest first (undelivered only by default)."""
+        where, params = ["id > ?"], [after]
+        if owner is not None:
+            where.append("owner = ?")
+            params.append(owner)
+        if pending:
+            where.append("delivered IS NULL")
+        rows = self._db().execute(
+            f"SELECT {OUTBOX_COLUMNS} FROM alert_outbox WHERE {' AND '.join(where)} "
+            "ORDER BY id LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [_to_alert(row) for row in rows]
+
+    def ack(self, ids):
+        """Mark alerts delivered. Returns how many were still pending."""
+        db = self._db()
+        with db:
+            return db.executemany(
+                "UPDATE alert_outbox SET delivered = ? WHERE id = ? AND delivered IS NULL",
+                ((time.time(), int(i)) for i in ids)
+            ).rowcount
+
+    def count(self):
+        """Number of rules, from the last rule-version check (no table scan)."""
+        self._refresh()
+        return self._version[1]
+
+    def pending(self):
+        return self._db().execute(
+            "SELECT COUNT(*) FROM alert_outbox WHERE delivered IS NULL").fetchone()[0]
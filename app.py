@@ -1,9 +1,38 @@
 import os
-import statistics
+import json
+import math
+import time
+import struct
 import logging
-from flask import Flask, request, jsonify, render_template
+import functools
+import threading
+from startup_profile import profile
+from flask import Flask, Response, request, jsonify, render_template, g
 from dotenv import load_dotenv
-from google import genai
+profile.mark("import flask")
+from reading_store import ReadingStore, SENSOR_KEYS, DEFAULT_PATH, InvalidDevice, check_device
+from llm_cache import LLMCache, cache_key
+from llm_jobs import LLMRunner, CircuitBreaker, CircuitOpen, Busy
+from llm_batch import PromptCoalescer
+from history_store import HistoryStore
+from metrics import Metrics, DEFAULT_DIR as DEFAULT_METRICS_DIR
+from page_cache import PageCache
+from fast_json import FastJSONProvider, project
+import http_compression
+import images
+from timeseries import TimeSeriesStore, METRICS, GRANULARITIES
+from alerts import AlertEngine
+from percentiles import CohortPercentiles, SKETCH_SPECS
+from farm_state import FarmState, FarmStateCache, SHRS_WINDOW, detect_risk_trend
+from translations import (
+    build_report, build_translated_report, format_escalation, load_catalog
+)
+from batch_scoring import score_batch, decode_advice
+# Deterministic advice engine (no AI required) — thresholds live in advice_rules
+from advice_rules import (
+    compute_env_risk, compute_practice_risk, advice_rule_hits, render_advice, TEMPLATES
+)
+profile.mark("import app modules")
 
 # -------------------------------------------------
 # ENV + GEMINI CLIENT SETUP
@@ -11,38 +40,339 @@ from google import genai
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+ai_enabled = bool(GEMINI_API_KEY)
+
+# Per-call deadline (seconds), also enforced on the HTTP request itself
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 20))
+
+# The Gemini SDK takes longer to import than the rest of the app, so it is
+# loaded on first use; GEMINI_WARMUP=1 loads it in the background at boot.
 client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The Gemini client — imports the SDK and creates it on first call."""
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                started = time.perf_counter()
+                from google import genai
+                client = genai.Client(
+                    api_key=GEMINI_API_KEY,
+                    http_options={"timeout": int(GEMINI_TIMEOUT * 1000)}
+                )
+                if profile.enabled:
+                    logging.warning(f"Gemini client loaded in "
+                                    f"{(time.perf_counter() - started) * 1000:.1f} ms")
+    return client
+
+
+def warm_up_client():
+    try:
+        get_client()
+    except Exception as e:
+        logging.warning(f"Gemini warm-up failed: {e}")
+
 
-if GEMINI_API_KEY:
-    client = genai.Client(api_key=GEMINI_API_KEY)
-else:
+if not ai_enabled:
     logging.warning("GEMINI_API_KEY not set — AI features will be disabled")
+elif os.getenv("GEMINI_WARMUP", "").lower() in ("1", "true", "yes"):
+    threading.Thread(target=warm_up_client, name="gemini-warmup", daemon=True).start()
+
+# Prometheus metrics, one mmap file per worker, summed at /metrics
+metrics = Metrics(os.getenv("METRICS_DIR", DEFAULT_METRICS_DIR))
+metrics.describe("http_request_duration_seconds", "histogram",
+                 "Time spent handling requests, by route")
+metrics.describe("http_requests_total", "counter", "Requests by route and status class")
+metrics.describe("gemini_call_duration_seconds", "histogram",
+                 "Duration of Gemini generate_content calls, by model")
+metrics.describe("gemini_calls_total", "counter", "Gemini calls by model and outcome")
+profile.mark("config + metrics")
+
+
+# Opens after consecutive failed upstream calls (a failed batch counts once)
+gemini_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", 5)),
+    reset_after=float(os.getenv("GEMINI_BREAKER_RESET", 30))
+)
+
+
+def call_gemini(model, prompt, config=None):
+    """One timed upstream Gemini call; returns the response text."""
+    started = time.perf_counter()
+    try:
+        response = get_client().models.generate_content(
+            model=model, contents=prompt, config=config)
+        text = response.candidates[0].content.parts[0].text.strip()
+    except Exception:
+        gemini_breaker.record_failure()
+        metrics.inc("gemini_calls_total", (("model", model), ("outcome", "failure")))
+        raise
+    finally:
+        metrics.observe("gemini_call_duration_seconds", (("model", model),),
+                        time.perf_counter() - started)
+    gemini_breaker.record_success()
+    metrics.inc("gemini_calls_total", (("model", model), ("outcome", "success")))
+    return text
+
+
+# Identical concurrent prompts share one call; distinct prompts arriving
+# within GEMINI_BATCH_WINDOW seconds go upstream as one batch prompt.
+# GEMINI_MAX_CONCURRENCY bounds the upstream requests in flight.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 4))
+GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", 8))
+gemini = PromptCoalescer(
+    call_gemini,
+    window=float(os.getenv("GEMINI_BATCH_WINDOW", 0.05)),
+    max_batch=GEMINI_BATCH_SIZE,
+    max_workers=GEMINI_MAX_CONCURRENCY
+)
+
+
+def generate_text(model, prompt):
+    """Response text for `prompt`, via the coalescer."""
+    return gemini.generate(model, prompt)
+
+RECOMMENDATION_MODEL = "gemini-3-flash-preview"
+
+# Gemini-formatted reports, keyed by a hash of the prompt inputs. Persisted
+# to a SQLite file shared by every worker (LLM_CACHE_PATH; empty = memory
+# only): a polish job finishes on one worker but is polled on any of them.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+if LLM_CACHE_PATH is None:
+    # Flask's instance folder, as for the history database (the app object comes later)
+    instance_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance")
+    os.makedirs(instance_dir, exist_ok=True)
+    LLM_CACHE_PATH = os.path.join(instance_dir, "llm_cache.db")
+recommendation_cache = LLMCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+    path=LLM_CACHE_PATH
+)
+
+# Bounded pool for Gemini jobs: deadline, queue limit, circuit breaker.
+# Its threads mostly wait on the coalescer, so it has room for full batches.
+llm_runner = LLMRunner(
+    max_workers=GEMINI_MAX_CONCURRENCY * max(GEMINI_BATCH_SIZE, 1),
+    max_pending=int(os.getenv("GEMINI_MAX_PENDING", 32)),
+    timeout=GEMINI_TIMEOUT,
+    breaker=gemini_breaker,
+    record_outcomes=False
+)
+
+TRANSLATION_MODEL = "gemini-2.0-flash"
+
+# Translations keyed by (text hash, language), same persistence as above
+translation_cache = LLMCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+    path=LLM_CACHE_PATH,
+    table="translation_cache"
+)
+
+# Pre-translated report templates (python translations.py build)
+translation_catalog = load_catalog()
+profile.mark("llm caches + catalog")
 
 # -------------------------------------------------
 # FLASK APP
 # -------------------------------------------------
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+
+# Shared reading store for the current test of each device
+# (memory-mapped, so every gunicorn worker sees the same readings)
+READINGS_PER_TEST = int(os.getenv("READINGS_PER_TEST", 10))
+DEFAULT_DEVICE = "default"
+reading_store = ReadingStore(
+    path=os.getenv("READING_STORE_PATH", DEFAULT_PATH),
+    slots=int(os.getenv("READING_STORE_SLOTS", 1024)),
+    capacity=min(READINGS_PER_TEST, int(os.getenv("READING_RING_SIZE", 32))),
+    window=READINGS_PER_TEST
+)
+profile.mark("reading store")
+
+
+def device_id(payload=None):
+    """Device the request refers to — body `device_id`, `?device=`, or default."""
+    if payload and payload.get("device_id"):
+        return check_device(str(payload["device_id"]))
+    return check_device(request.args.get("device", DEFAULT_DEVICE))
+
+
+@app.errorhandler(InvalidDevice)
+def invalid_device(e):
+    return jsonify({"error": str(e)}), 400
+
+
+# Test history — durable SQLite store shared by all workers
+os.makedirs(app.instance_path, exist_ok=True)
+history_store = HistoryStore(
+    os.getenv("HISTORY_DB_PATH", os.path.join(app.instance_path, "history.db"))
+)
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
+DEFAULT_FARM = "default"
+
+# Hourly / daily / seasonal rollups per farm, in the same database file
+timeseries = TimeSeriesStore(history_store.path)
+TREND_MAX_WINDOW = 1000
+
+# SHRS / sensor-average sketches per crop + irrigation cohort
+cohort_percentiles = CohortPercentiles(history_store.path)
+
+# Standing threshold alerts, checked on ingest; streaks can span at most
+# the readings the ring keeps per device
+alert_engine = AlertEngine(history_store.path, max_consecutive=reading_store.capacity)
+ALERT_OUTBOX_PAGE_SIZE = 100
+ALERT_OUTBOX_MAX_PAGE_SIZE = 1000
+profile.mark("history + rollups + alerts")
+
+
+def load_farm_state(farm_id):
+    """Rebuild a farm's state from its newest history records."""
+    rows = history_store.recent_for_farm(farm_id, SHRS_WINDOW)
+    if not rows:
+        return FarmState()
+    last_id, _, crop, irrigation, fertilizer = rows[0]
+    return FarmState(
+        shrs=[max(0, min(int(r[1]), 100)) for r in reversed(rows)],
+        irrigation=irrigation, fertilizer=fertilizer, crop=crop, last_id=last_id
+    )
+
 
-# In-memory storage for current test
-readings = []
+# COMPONENT 1 + 3 — per-farm SHRS window and previous practice inputs,
+# bounded in memory and restored lazily from history
+farm_states = FarmStateCache(
+    loader=load_farm_state,
+    version=history_store.latest_id,
+    max_bytes=int(os.getenv("FARM_STATE_MAX_BYTES", 64 * 1024 * 1024)),
+    idle_ttl=float(os.getenv("FARM_STATE_IDLE_TTL", 3600))
+)
 
-# COMPONENT 1 — SHRS History (rolling window of last 5)
-shrs_history = []
+profile.mark("farm state")
+
+# -------------------------------------------------
+# REQUEST METRICS
+# -------------------------------------------------
+# Per-worker store sizes are republished at most this often (seconds)
+GAUGE_INTERVAL = 1.0
+_gauges_updated = 0.0
+
+
+def update_worker_gauges():
+    """Sizes of this worker's in-memory stores (summed over live workers)."""
+    metrics.set("llm_cache_entries", (("cache", "recommendation"),), len(recommendation_cache))
+    metrics.set("llm_cache_entries", (("cache", "translation"),), len(translation_cache))
+    metrics.set("farm_state_entries", (), len(farm_states))
+    metrics.set("farm_state_bytes", (), farm_states.bytes)
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    global _gauges_updated
+    started = getattr(g, "request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        labels = (("method", request.method), ("route", route))
+        metrics.observe("http_request_duration_seconds", labels,
+                        time.perf_counter() - started)
+        metrics.inc("http_requests_total",
+                    labels + (("status", f"{response.status_code // 100}xx"),))
+    now = time.monotonic()
+    if now - _gauges_updated >= GAUGE_INTERVAL:
+        _gauges_updated = now
+        update_worker_gauges()
+    return response
 
-# COMPONENT 3 — Previous practice inputs for escalation detection
-previous_practices = {"irrigation": None, "fertilizer": None, "crop": None}
+# -------------------------------------------------
+# API RESPONSES (field projection, compression)
+# -------------------------------------------------
+# JSON bodies at least this large are gzip/brotli compressed when accepted
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+
+
+def jsonify_fields(data):
+    """jsonify(data), keeping only the keys named in ?fields= if given."""
+    return jsonify(project(data, request.args.get("fields")))
+
+
+@app.after_request
+def compress_json(response):
+    if (response.mimetype != "application/json" or response.direct_passthrough
+            or response.is_streamed or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = http_compression.negotiate(request)
+    if encoding != "identity":
+        response.set_data(http_compression.compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
 
-# Test history — stores all past test records
-test_history = []
+# -------------------------------------------------
+# STATIC PAGES (rendered once, served as cached bytes)
+# -------------------------------------------------
+PAGE_MAX_AGE = int(os.getenv("PAGE_MAX_AGE", 300))
+page_cache = PageCache()
+
+# Responsive image variants (python images.py build); content-hashed,
+# so they can be cached forever
+image_manifest = images.load_manifest()
+responsive_image = functools.partial(images.responsive_image, image_manifest)
+app.jinja_env.globals.update(
+    responsive_image=responsive_image,
+    image_url=functools.partial(images.image_url, image_manifest),
+    image_set=functools.partial(images.image_set, image_manifest),
+)
+BLOG_IMAGE_SIZES = "(max-width: 780px) 100vw, 780px"
+profile.mark("page cache + images")
+
+
+@app.after_request
+def cache_hashed_assets(response):
+    if request.path.startswith(images.BUILD_URL_PREFIX) and response.status_code in (200, 304):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
+
+
+def prerendered(view):
+    """Cache the view's HTML with gzip/brotli variants and ETags.
+
+    Only for views whose output does not depend on the request. In debug
+    mode pages are rendered per request so template edits show up.
+    """
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+        if app.debug:
+            return view(**kwargs)
+        page = page_cache.get(request.path, lambda: view(**kwargs))
+        return page.respond(request, max_age=PAGE_MAX_AGE)
+    return wrapper
 
 # -------------------------------------------------
 # ROUTES
 # -------------------------------------------------
 @app.route("/")
+@prerendered
 def index():
     return render_template("index.html")
 
 @app.route("/homepage")
+@prerendered
 def homepage():
     return render_template("homepage.html")
 
@@ -50,16 +380,17 @@ def homepage():
 # BLOG PAGES
 # -------------------------------------------------
 @app.route("/blog/soil-degradation")
+@prerendered
 def blog_soil_degradation():
     return render_template("blog.html",
         title="Soil Degradation Prevention",
         badge="Soil Science",
-        hero_image="/static/images/blog_soil_degradation.png",
-        content="""
+        hero_image="blog_soil_degradation.png",
+        content=f"""
         <p><strong>Soil degradation is one of the most pressing environmental challenges of our time, affecting over 33% of the world's agricultural land.</strong> Without proactive monitoring, fertile topsoil erodes at alarming rates — up to 100 times faster than it can naturally regenerate. This silent crisis threatens food security for billions and accelerates climate change by releasing stored carbon into the atmosphere.</p>
 
         <figure class="blog-image">
-            <img src="/static/images/soil_degradation.png" alt="Soil degradation comparison showing cracked, dry earth versus healthy soil">
+            {responsive_image('soil_degradation.png', 'Soil degradation comparison showing cracked, dry earth versus healthy soil', sizes=BLOG_IMAGE_SIZES)}
             <figcaption>Degraded soil (left) vs. healthy, nutrient-rich soil (right) — the difference proactive monitoring makes</figcaption>
         </figure>
 
@@ -75,16 +406,17 @@ def blog_soil_degradation():
     )
 
 @app.route("/blog/water-management")
+@prerendered
 def blog_water_management():
     return render_template("blog.html",
         title="Water Management Optimization",
         badge="Resource Conservation",
-        hero_image="/static/images/blog_water_management.png",
-        content="""
+        hero_image="blog_water_management.png",
+        content=f"""
         <p><strong>Agriculture accounts for 70% of global freshwater withdrawal, yet nearly 60% of irrigation water is wasted through inefficient practices.</strong> As droughts become more frequent and water tables decline, optimizing irrigation isn't just environmentally responsible — it's essential for farm survival. Smart water management can reduce water usage by up to 40% while actually improving crop health.</p>
 
         <figure class="blog-image">
-            <img src="/static/images/blog_water_management.png" alt="Smart irrigation system with soil moisture sensors">
+            {responsive_image('blog_water_management.png', 'Smart irrigation system with soil moisture sensors', sizes=BLOG_IMAGE_SIZES)}
             <figcaption>Intelligent irrigation adapts in real-time based on soil moisture data from embedded sensors</figcaption>
         </figure>
 
@@ -100,16 +432,17 @@ def blog_water_management():
     )
 
 @app.route("/blog/crop-yield")
+@prerendered
 def blog_crop_yield():
     return render_template("blog.html",
         title="Crop Yield Enhancement",
         badge="Productivity",
-        hero_image="/static/images/blog_crop_yield.png",
-        content="""
+        hero_image="blog_crop_yield.png",
+        content=f"""
         <p><strong>Healthy soil is the foundation of productive farming — research shows that improving soil organic matter by just 1% can increase crop yields by 10–15%.</strong> Yet most farmers lack the tools to understand what's happening beneath the surface. Without real-time soil data, decisions about planting, fertilizing, and harvesting are based on guesswork rather than science, leaving significant productivity gains on the table.</p>
 
         <figure class="blog-image">
-            <img src="/static/images/blog_crop_yield.png" alt="Data-driven crop yield optimization with soil analytics">
+            {responsive_image('blog_crop_yield.png', 'Data-driven crop yield optimization with soil analytics', sizes=BLOG_IMAGE_SIZES)}
             <figcaption>Real-time soil insights enable farmers to make data-driven decisions that directly boost yields</figcaption>
         </figure>
 
@@ -125,16 +458,17 @@ def blog_crop_yield():
     )
 
 @app.route("/blog/sustainable-practices")
+@prerendered
 def blog_sustainable_practices():
     return render_template("blog.html",
         title="Sustainable Farming Practices",
         badge="Regenerative Agriculture",
-        hero_image="/static/images/blog_sustainable.png",
-        content="""
+        hero_image="blog_sustainable.png",
+        content=f"""
         <p><strong>Regenerative agriculture isn't just a trend — it's a necessity.</strong> Conventional farming practices have degraded one-third of the world's arable land over the past 40 years. The shift to sustainable, regenerative methods is critical, but many farmers hesitate because they lack confidence in new approaches. Without data to guide the transition, the perceived risk of changing established practices feels too high.</p>
 
         <figure class="blog-image">
-            <img src="/static/images/blog_sustainable.png" alt="Sustainable farming cycle showing crop rotation and soil regeneration">
+            {responsive_image('blog_sustainable.png', 'Sustainable farming cycle showing crop rotation and soil regeneration', sizes=BLOG_IMAGE_SIZES)}
             <figcaption>The regenerative farming cycle: healthier soil leads to better yields, which enables more sustainable practices</figcaption>
         </figure>
 
@@ -152,32 +486,175 @@ def blog_sustainable_practices():
 
 @app.route("/start-test", methods=["POST"])
 def start_test():
-    global readings
-    readings = []
-    return jsonify({"status": "started"})
+    session = reading_store.start_session(device_id(request.get_json(silent=True)))
+    return jsonify({"status": "started", "session": session})
+
+
+def check_values(values):
+    """Return `values` if all are finite; NaN/inf would poison the session aggregates."""
+    if not all(math.isfinite(v) for v in values):
+        raise ValueError("Sensor values and timestamp must be finite numbers")
+    return values
+
+
+def parse_reading(item, now):
+    """JSON reading → (soil_ph, soil_temp, soil_moisture, air_humidity, timestamp)."""
+    values = [float(item[k]) for k in SENSOR_KEYS]
+    values.append(float(item.get("timestamp") or now))
+    return check_values(tuple(values))
 
 
 @app.route("/data", methods=["POST"])
 def receive_data():
-    global readings
-    if len(readings) < 10:
-        readings.append(request.json)
+    data = request.get_json(silent=True) or {}
+    missing = [k for k in SENSOR_KEYS if k not in data]
+    if missing:
+        return jsonify({"error": f"Missing sensor fields: {', '.join(missing)}"}), 400
+    try:
+        values = parse_reading(data, time.time())
+    except (TypeError, ValueError):
+        return jsonify({"error": "Sensor values and timestamp must be finite numbers"}), 400
+    reading = dict(zip(SENSOR_KEYS, values))
+    reading["timestamp"] = values[4]
+    device = device_id(data)
+    fired = []
+    previous = reading_store.readings(device) if alert_engine.active() else None
+    if reading_store.append(device, reading) and previous is not None:
+        fired = queue_alerts(device, [{k: reading[k] for k in SENSOR_KEYS}], previous)
+    with reading_arrived:
+        reading_arrived.notify_all()
+    if fired:
+        return jsonify({"status": "ok", "alerts": [a["message"] for a in fired]})
     return jsonify({"status": "ok"})
 
 
+def queue_alerts(device, readings, previous):
+    """Check readings just stored for `device` against the standing rules.
+
+    `previous` is the device's ring content from before they were stored.
+    """
+    try:
+        fired = alert_engine.evaluate(device, readings, previous)
+    except Exception as e:
+        # A failing outbox must not lose the reading itself
+        logging.warning(f"Alert evaluation failed for {device}: {e}")
+        return []
+    for alert in fired:
+        metrics.inc("alerts_fired_total", (("sensor", alert["sensor"]),))
+    return fired
+
+
+# -------------------------------------------------
+# BATCH INGEST (gateways)
+# -------------------------------------------------
+# Binary frames are little-endian, fixed 40 bytes each:
+#   soil_ph, soil_temp, soil_moisture, air_humidity  float32 x4
+#   device id                                        16 bytes, NUL-padded utf-8
+#   timestamp                                        float64 epoch (0 = now)
+READING_FRAME = struct.Struct("<4f16sd")
+MAX_BATCH_ERRORS = 20
+
+
+def parse_ndjson_batch(body, default_device):
+    """NDJSON body → ([(device, values)], [errors])."""
+    rows, errors = [], []
+    now = time.time()
+    for line_no, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            values = parse_reading(item, now)
+            device = check_device(str(item.get("device_id") or default_device))
+        except (ValueError, KeyError, TypeError) as e:
+            errors.append({"line": line_no, "error": f"{type(e).__name__}: {e}"})
+            continue
+        rows.append((device, values))
+    return rows, errors
+
+
+def parse_binary_batch(body, default_device):
+    """Packed READING_FRAME body → ([(device, values)], [errors])."""
+    if len(body) % READING_FRAME.size:
+        return [], [{"frame": len(body) // READING_FRAME.size,
+                     "error": f"Body length is not a multiple of {READING_FRAME.size} bytes"}]
+    now = time.time()
+    rows, errors = [], []
+    for frame, (ph, temp, moisture, humidity, raw_id, ts) in enumerate(
+            READING_FRAME.iter_unpack(body)):
+        device = raw_id.rstrip(b"\0").decode("utf-8", "replace") or default_device
+        try:
+            # Replacement characters can push a 16-byte id past the slot key
+            check_device(device)
+            values = check_values((ph, temp, moisture, humidity, ts or now))
+        except ValueError as e:
+            errors.append({"frame": frame, "error": str(e)})
+            continue
+        rows.append((device, values))
+    return rows, errors
+
+
+@app.route("/data/batch", methods=["POST"])
+def receive_data_batch():
+    body = request.get_data()
+    if request.mimetype == "application/octet-stream":
+        rows, errors = parse_binary_batch(body, device_id())
+    else:
+        rows, errors = parse_ndjson_batch(body, device_id())
+
+    # Streaks are checked against the ring as it was before this batch, so
+    # batches longer than the ring are still evaluated in full
+    previous = None
+    if rows and alert_engine.active():
+        previous = {device: reading_store.readings(device) for device in {d for d, _ in rows}}
+    accepted = reading_store.append_many(rows) if rows else {}
+    fired = 0
+    if accepted and previous is not None:
+        by_device = {}
+        for device, values in rows:
+            by_device.setdefault(device, []).append(values)
+        for device, values in by_device.items():
+            # A device's rows are accepted in order until its session fills
+            stored = [dict(zip(SENSOR_KEYS, v)) for v in values[:accepted[device]]]
+            if stored:
+                fired += len(queue_alerts(device, stored, previous[device]))
+    if accepted:
+        with reading_arrived:
+            reading_arrived.notify_all()
+
+    total_accepted = sum(accepted.values())
+    return jsonify({
+        "status": "ok" if not errors else "partial",
+        "received": len(rows) + len(errors),
+        "accepted": total_accepted,
+        "dropped": len(rows) - total_accepted,  # sessions already full
+        "rejected": len(errors),
+        "alerts": fired,
+        "devices": accepted,
+        "errors": errors[:MAX_BATCH_ERRORS]
+    })
+
+
 @app.route("/latest")
 def latest():
-    if not readings:
+    reading = reading_store.latest(device_id())
+    if not reading:
         return jsonify({})
-    return jsonify(readings[-1])
+    return jsonify_fields(reading)
 
 
 @app.route("/summary")
 def summary():
-    if len(readings) < 10:
-        return jsonify({"count": len(readings)})
+    return jsonify_fields(build_summary(device_id()))
+
+
+def build_summary(device):
+    """Progress of the device's current test, plus averages once complete."""
+    stats = reading_store.stats(device)
+    if stats["count"] < READINGS_PER_TEST:
+        return {"count": stats["count"], "target": READINGS_PER_TEST}
 
-    avg = lambda k: round(statistics.mean([r[k] for r in readings]), 2)
+    avg = lambda k: round(stats[k]["mean"], 2)
 
     avg_ph = avg("soil_ph")
     avg_temp = avg("soil_temp")
@@ -185,181 +662,106 @@ def summary():
     avg_humidity = avg("air_humidity")
 
     # -------- Environmental Risk (0–100) --------
-    env_risk = 0
-
-    if avg_ph < 5.5 or avg_ph > 7.5:
-        env_risk += 25
-
-    if avg_moisture < 30:
-        env_risk += 25
-    elif avg_moisture < 40:
-        env_risk += 10
+    env_risk = compute_env_risk(avg_ph, avg_temp, avg_moisture, avg_humidity)
 
-    if avg_temp > 40:
-        env_risk += 25
-    elif avg_temp > 35:
-        env_risk += 10
-
-    if avg_humidity < 35:
-        env_risk += 25
-    elif avg_humidity < 50:
-        env_risk += 10
-
-    return jsonify({
-        "count": 10,
+    return {
+        "count": READINGS_PER_TEST,
+        "target": READINGS_PER_TEST,
         "avg_ph": avg_ph,
         "avg_temp": avg_temp,
         "avg_moisture": avg_moisture,
         "avg_humidity": avg_humidity,
-        "soil_condition_risk": env_risk  # practice_risk merged on /ai-recommendation
-    })
+        "soil_condition_risk": env_risk,  # practice_risk merged on /ai-recommendation
+        "stats": {k: stats[k] for k in SENSOR_KEYS}
+    }
 
 
 # -------------------------------------------------
-# DETERMINISTIC ADVICE ENGINE (no AI required)
+# SUMMARY STREAM (Server-Sent Events)
 # -------------------------------------------------
-def compute_practice_risk(crop, irrigation, fertilizer):
-    """Practice-based risk modifier. Fully deterministic."""
-    risk = 0
-    if irrigation and irrigation.lower() == "daily":
-        risk += 10
-    if fertilizer and fertilizer.lower() == "weekly":
-        risk += 10
-    if crop and crop.lower() == "rice":
-        risk += 5
-    return risk
-
-
-def generate_structured_advice(avg_ph, avg_temp, avg_moisture, avg_humidity,
-                                crop, irrigation, fertilizer):
-    """
-    Pure deterministic rules → list of actionable advice strings.
-    Works fully offline. No API dependency.
-    """
-    advice = []
-
-    # ---- pH Rules ----
-    if avg_ph < 5.5:
-        advice.append(
-            f"⚠️ **Acidic Soil (pH {avg_ph})**: Apply agricultural lime "
-            f"(calcium carbonate) at 2–4 tonnes/hectare to raise pH. "
-            f"Retest after 4–6 weeks. Avoid ammonium-based fertilizers "
-            f"which further acidify soil."
-        )
-    elif avg_ph > 7.5:
-        advice.append(
-            f"⚠️ **Alkaline Soil (pH {avg_ph})**: Apply elemental sulfur "
-            f"or gypsum at 1–2 tonnes/hectare. Incorporate organic matter "
-            f"(composted manure, peat) to gradually lower pH. Avoid "
-            f"over-liming."
-        )
-    else:
-        advice.append(
-            f"✅ **Soil pH ({avg_ph})** is within the optimal range "
-            f"(5.5–7.5). Maintain current practices."
-        )
-
-    # ---- Moisture + Irrigation Rules ----
-    if avg_moisture < 30 and (not irrigation or irrigation.lower() != "daily"):
-        advice.append(
-            f"⚠️ **Low Moisture ({avg_moisture}%)**: Increase irrigation "
-            f"frequency. Consider drip irrigation for water efficiency. "
-            f"Apply organic mulch (4–6 cm) to reduce evaporation."
-        )
-    elif avg_moisture < 30 and irrigation and irrigation.lower() == "daily":
-        advice.append(
-            f"⚠️ **Low Moisture Despite Daily Irrigation ({avg_moisture}%)**: "
-            f"Soil may have poor water retention. Add compost or "
-            f"coco peat to improve structure. Check for drainage issues."
-        )
-    elif avg_moisture > 50 and irrigation and irrigation.lower() == "daily":
-        advice.append(
-            f"⚠️ **Over-Irrigation Detected (Moisture {avg_moisture}%, "
-            f"Daily Irrigation)**: Reduce watering frequency to every "
-            f"2–3 days. Over-watering leaches nutrients and promotes "
-            f"root rot. Switch to scheduled drip irrigation."
-        )
-    else:
-        advice.append(
-            f"✅ **Soil Moisture ({avg_moisture}%)** is adequate. "
-            f"Continue current irrigation schedule."
-        )
-
-    # ---- Temperature Rules ----
-    if avg_temp > 40:
-        advice.append(
-            f"🔥 **Extreme Heat ({avg_temp}°C)**: Apply straw mulch "
-            f"(8–10 cm) immediately. Irrigate during early morning "
-            f"or late evening. Consider shade netting for sensitive crops."
-        )
-    elif avg_temp > 35:
-        advice.append(
-            f"⚠️ **High Temperature ({avg_temp}°C)**: Monitor crop stress "
-            f"closely. Increase organic mulch cover. Avoid fertilizer "
-            f"application during peak heat to prevent root burn."
-        )
-    elif avg_temp < 10:
-        advice.append(
-            f"❄️ **Low Temperature ({avg_temp}°C)**: Risk of frost damage. "
-            f"Use row covers or cold frames. Delay planting of warm-season "
-            f"crops until soil warms above 15°C."
-        )
+# /data in this worker wakes streams immediately; readings that land on
+# another worker are picked up on the next STREAM_POLL_INTERVAL tick.
+reading_arrived = threading.Condition()
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", 0.25))
+STREAM_TIMEOUT = float(os.getenv("STREAM_TIMEOUT", 300))
+STREAM_KEEPALIVE = 15
+
+# Each open stream holds a request thread (gunicorn --threads 8), so only
+# this many may be open per worker; past it the client gets a 503 and
+# falls back to polling /summary, leaving threads free for /data.
+MAX_STREAMS = int(os.getenv("STREAM_MAX_CONNECTIONS", 4))
+stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+@app.route("/summary/stream")
+def summary_stream():
+    device = device_id()
+    if not stream_slots.acquire(blocking=False):
+        response = jsonify({"error": "Too many open streams; poll /summary instead"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+
+    def events():
+        last = None
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < STREAM_TIMEOUT:
+            state = reading_store.session(device)
+            if state != last:
+                last = state
+                last_sent = time.monotonic()
+                payload = build_summary(device)
+                payload["latest"] = reading_store.latest(device)
+                if payload["count"] >= READINGS_PER_TEST:
+                    yield sse_event("complete", payload)
+                    return
+                yield sse_event("progress", payload)
+            elif time.monotonic() - last_sent > STREAM_KEEPALIVE:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            with reading_arrived:
+                reading_arrived.wait(STREAM_POLL_INTERVAL)
+        yield sse_event("timeout", {"count": last[1] if last else 0})
+
+    response = Response(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    # Released when the server closes the response, however the stream ends
+    response.call_on_close(stream_slots.release)
+    return response
 
-    # ---- Humidity Rules ----
-    if avg_humidity < 35:
-        advice.append(
-            f"⚠️ **Low Humidity ({avg_humidity}%)**: Increase mulching to "
-            f"preserve soil moisture. Consider windbreaks to reduce "
-            f"evapotranspiration. Mist irrigation may help in greenhouse "
-            f"settings."
-        )
-    elif avg_humidity > 70 and avg_temp > 28:
-        advice.append(
-            f"🦠 **Fungal Disease Risk (Humidity {avg_humidity}%, "
-            f"Temp {avg_temp}°C)**: Monitor for blight, mildew, and "
-            f"rust. Ensure adequate plant spacing for airflow. "
-            f"Apply preventive copper-based fungicide if symptoms appear."
-        )
 
-    # ---- Fertilizer Rules ----
-    if fertilizer and fertilizer.lower() == "weekly":
-        advice.append(
-            f"⚠️ **Frequent Fertilization (Weekly)**: Risk of nutrient "
-            f"buildup and salt stress. Adopt split nitrogen application — "
-            f"apply 40% at planting, 30% at tillering, 30% at flowering. "
-            f"Conduct soil nutrient tests every 3 months."
-        )
-    elif fertilizer and fertilizer.lower() == "none":
-        advice.append(
-            f"⚠️ **No Fertilizer Applied**: Soil nutrient depletion is "
-            f"likely over time. Consider a balanced NPK application or "
-            f"composted organic manure as a minimum baseline."
-        )
+# -------------------------------------------------
+# BATCH RISK SCORING (columnar, vectorized)
+# -------------------------------------------------
+@app.route("/risk/batch", methods=["POST"])
+def risk_batch():
+    data = request.json or {}
+    missing = [k for k in ("avg_ph", "avg_temp", "avg_moisture", "avg_humidity") if k not in data]
+    if missing:
+        return jsonify({"error": f"Missing columns: {', '.join(missing)}"}), 400
 
-    # ---- Crop-Specific Rules ----
-    if crop and crop.lower() == "rice":
-        advice.append(
-            f"🌾 **Rice Cultivation**: Maintain standing water depth of "
-            f"2–5 cm during vegetative stage. Alternate wetting and drying "
-            f"(AWD) technique saves 15–30% water with no yield loss."
+    try:
+        scores = score_batch(
+            data["avg_ph"], data["avg_temp"], data["avg_moisture"], data["avg_humidity"],
+            data.get("crop"), data.get("irrigation"), data.get("fertilizer")
         )
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
 
-    return advice
-
-
-# -------------------------------------------------
-# COMPONENT 2 — RISK TREND DETECTION
-# -------------------------------------------------
-def detect_risk_trend():
-    """Analyze last 3 SHRS values for trend direction."""
-    if len(shrs_history) < 3:
-        return "Insufficient Data"
-    last_three = shrs_history[-3:]
-    if last_three[2] > last_three[1] > last_three[0]:
-        return "Increasing Risk"
-    elif last_three[2] < last_three[1] < last_three[0]:
-        return "Decreasing Risk"
-    return "Stable"
+    result = {
+        "env_risk": scores["env_risk"].tolist(),
+        "practice_risk": scores["practice_risk"].tolist(),
+        "shrs": scores["shrs"].tolist(),
+        "advice": decode_advice(scores["advice"])
+    }
+    if "field_id" in data:
+        result["field_id"] = data["field_id"]
+    return jsonify(result)
 
 
 # -------------------------------------------------
@@ -372,37 +774,34 @@ FERTILIZER_RANK = {
     "none": 1, "rare": 2, "monthly": 3, "weekly": 4
 }
 
-def detect_practice_escalation(current_irrigation, current_fertilizer):
-    """Compare current vs. previous practice inputs for escalation."""
-    global previous_practices
-    warnings = []
+def detect_practice_escalation(previous, current_irrigation, current_fertilizer):
+    """Compare current vs. previous practice inputs (a FarmState) for escalation.
+
+    Returns a list of {"practice", "previous", "current"} or None;
+    format_escalation turns each into its warning sentence.
+    """
+    escalations = []
 
-    prev_irr = previous_practices.get("irrigation")
-    prev_fert = previous_practices.get("fertilizer")
+    prev_irr = previous.irrigation
+    prev_fert = previous.fertilizer
 
     if prev_irr and current_irrigation:
         old_rank = IRRIGATION_RANK.get(prev_irr.lower(), 0)
         new_rank = IRRIGATION_RANK.get(current_irrigation.lower(), 0)
         if new_rank > old_rank:
-            warnings.append(
-                f"Irrigation frequency increased ({prev_irr} → {current_irrigation}) "
-                f"— monitor water usage and soil saturation."
-            )
+            escalations.append({
+                "practice": "irrigation", "previous": prev_irr, "current": current_irrigation
+            })
 
     if prev_fert and current_fertilizer:
         old_rank = FERTILIZER_RANK.get(prev_fert.lower(), 0)
         new_rank = FERTILIZER_RANK.get(current_fertilizer.lower(), 0)
         if new_rank > old_rank:
-            warnings.append(
-                f"Fertilizer application intensified ({prev_fert} → {current_fertilizer}) "
-                f"— watch for nutrient runoff and salt buildup."
-            )
-
-    # Update stored practices for next comparison
-    previous_practices["irrigation"] = current_irrigation
-    previous_practices["fertilizer"] = current_fertilizer
+            escalations.append({
+                "practice": "fertilizer", "previous": prev_fert, "current": current_fertilizer
+            })
 
-    return warnings if warnings else None
+    return escalations if escalations else None
 
 
 # -------------------------------------------------
@@ -410,17 +809,24 @@ def detect_practice_escalation(current_irrigation, current_fertilizer):
 # -------------------------------------------------
 @app.route("/ai-recommendation", methods=["POST"])
 def ai_recommendation():
-    global shrs_history
     data = request.json
 
-    avg_ph = float(data.get("avg_ph", 6.5))
-    avg_temp = float(data.get("avg_temp", 25))
-    avg_moisture = float(data.get("avg_moisture", 50))
-    avg_humidity = float(data.get("avg_humidity", 60))
+    try:
+        avg_ph = float(data.get("avg_ph", 6.5))
+        avg_temp = float(data.get("avg_temp", 25))
+        avg_moisture = float(data.get("avg_moisture", 50))
+        avg_humidity = float(data.get("avg_humidity", 60))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Sensor averages must be numbers"}), 400
+    # Checked before anything is stored: NaN/inf cannot be rolled up or ranked
+    if not all(math.isfinite(v) for v in (avg_ph, avg_temp, avg_moisture, avg_humidity)):
+        return jsonify({"error": "Sensor averages must be finite numbers"}), 400
     crop = data.get("crop", "")
     irrigation = data.get("irrigation", "")
     fertilizer = data.get("fertilizer", "")
     env_risk = int(data.get("risk_score", 0))
+    farm_id = str(data.get("farm_id") or DEFAULT_FARM)
+    farm = farm_states.get(farm_id)
 
     # ---- Step 1: Practice Risk ----
     practice_risk = compute_practice_risk(crop, irrigation, fertilizer)
@@ -428,33 +834,37 @@ def ai_recommendation():
     # ---- Step 2: Merged SHRS (capped at 100) ----
     shrs = min(env_risk + practice_risk, 100)
 
-    # ---- COMPONENT 1: Store SHRS in rolling history ----
-    shrs_history.append(shrs)
-    if len(shrs_history) > 5:
-        shrs_history = shrs_history[-5:]
+    # ---- COMPONENT 1: SHRS rolling history (this farm only) ----
+    shrs_history = (farm.shrs_history + [shrs])[-SHRS_WINDOW:]
 
     # ---- COMPONENT 2: Trend detection ----
-    trend = detect_risk_trend()
+    trend = detect_risk_trend(shrs_history)
 
     # ---- COMPONENT 3: Practice escalation ----
-    practice_warning = detect_practice_escalation(irrigation, fertilizer)
+    escalations = detect_practice_escalation(farm, irrigation, fertilizer)
+    practice_warning = [format_escalation(e) for e in escalations] if escalations else None
 
     # ---- Step 3: Deterministic Advice (works offline) ----
-    structured_advice = generate_structured_advice(
+    advice_ids = advice_rule_hits(
         avg_ph, avg_temp, avg_moisture, avg_humidity,
         crop, irrigation, fertilizer
     )
 
     # ---- COMPONENT 4: Build enriched fallback text ----
-    fallback_text = f"## Soil Health Risk Score: {shrs}/100\n\n"
-    fallback_text += f"**Environmental Risk:** {env_risk} | **Practice Risk:** {practice_risk}\n\n"
-    fallback_text += f"📈 **Trend:** {trend}\n\n"
-    if practice_warning:
-        for pw in practice_warning:
-            fallback_text += f"🚨 **Warning:** {pw}\n\n"
-    fallback_text += "### Recommendations\n\n"
-    for item in structured_advice:
-        fallback_text += f"- {item}\n\n"
+    # Structured form of the report, so /translate can rebuild it locally
+    report = {
+        "shrs": shrs,
+        "env_risk": env_risk,
+        "practice_risk": practice_risk,
+        "trend": trend,
+        "escalations": escalations,
+        "advice": advice_ids,
+        "values": {
+            "avg_ph": avg_ph, "avg_temp": avg_temp,
+            "avg_moisture": avg_moisture, "avg_humidity": avg_humidity
+        }
+    }
+    fallback_text = build_report(report)
 
     # ---- Build the result dict ----
     result = {
@@ -463,11 +873,57 @@ def ai_recommendation():
         "trend": trend,
         "practice_warning": practice_warning,
         "shrs_history": shrs_history,
+        "report": report,
         "source": "deterministic"
     }
 
-    # ---- Try Gemini formatting ----
-    if client:
+    # ---- Save to test history ----
+    from datetime import datetime
+    now = datetime.now()
+    record = {
+        "created": now.timestamp(),
+        "timestamp": now.strftime("%Y-%m-%d %H:%M"),
+        "sensor": {
+            "ph": avg_ph, "temp": avg_temp,
+            "moisture": avg_moisture, "humidity": avg_humidity
+        },
+        "practices": {
+            "crop": crop, "irrigation": irrigation, "fertilizer": fertilizer
+        },
+        "shrs": shrs,
+        "env_risk": env_risk,
+        "practice_risk": practice_risk,
+        "trend": trend,
+        "recommendation": fallback_text,  # replaced once the Gemini polish lands
+        "farm_id": farm_id
+    }
+    record_id = history_store.add(record)
+    farm.record(shrs, irrigation, fertilizer, crop, record_id)
+    values = {
+        "shrs": shrs, "avg_ph": avg_ph, "avg_temp": avg_temp,
+        "avg_moisture": avg_moisture, "avg_humidity": avg_humidity
+    }
+    timeseries.record(farm_id, values, ts=record["created"])
+    cohort_percentiles.record(crop, irrigation, values)
+    result["shrs_rank"] = cohort_percentiles.rank(crop, irrigation, {"shrs": shrs})["shrs"]
+
+    # ---- Try Gemini formatting (cached by prompt inputs) ----
+    # Only the key is rounded: it is the rules that fired plus the sensor
+    # values to one decimal, so near-identical readings that fire the same
+    # rules share one cached report. The prompt shows the values the rules
+    # saw; a cache hit may quote values up to 0.05 away from this request's.
+    prompt_key = cache_key(
+        RECOMMENDATION_MODEL, shrs, env_risk, practice_risk, trend, practice_warning,
+        [round(v, 1) for v in (avg_ph, avg_temp, avg_moisture, avg_humidity)],
+        [crop, irrigation, fertilizer], advice_ids
+    )
+    cached = recommendation_cache.get(prompt_key) if ai_enabled else None
+    if cached:
+        result["recommendation"] = cached
+        result["source"] = "gemini_formatted"
+        result["cached"] = True
+        history_store.update_recommendation(record_id, cached)
+    elif ai_enabled:
         trend_context = f"\nRisk Trend: {trend}"
         warning_context = ""
         if practice_warning:
@@ -494,54 +950,209 @@ Sensor Data (for context only, do NOT re-analyze):
 - Crop: {crop or 'Not specified'}, Irrigation: {irrigation or 'Not specified'}, Fertilizer: {fertilizer or 'Not specified'}
 
 Pre-Generated Recommendations to format:
-{chr(10).join(f"- {a}" for a in structured_advice)}
+{chr(10).join(f"- {render_advice(TEMPLATES[rule_id], report['values'])}" for rule_id in advice_ids)}
 """
+        def polish():
+            return generate_text(RECOMMENDATION_MODEL, prompt)
+
+        def store(text):
+            recommendation_cache.set(prompt_key, text)
+            history_store.update_recommendation(record_id, text)
+
+        # Non-blocking mode: return the deterministic report now, with a
+        # job id the client can poll at /ai-recommendation/jobs/<id>.
+        async_mode = bool(data.get("async")) or request.args.get("async") == "1"
         try:
-            response = client.models.generate_content(
-                model="gemini-3-flash-preview",
-                contents=prompt
-            )
-            text = response.candidates[0].content.parts[0].text.strip()
-            result["recommendation"] = text
-            result["source"] = "gemini_formatted"
+            future = llm_runner.submit(prompt_key, polish, on_done=store)
+            if async_mode:
+                result["job_id"] = prompt_key
+            else:
+                result["recommendation"] = llm_runner.wait(future)
+                result["source"] = "gemini_formatted"
+        except TimeoutError as e:
+            # Still running — it will land in the cache under this job id
+            result["job_id"] = prompt_key
+            logging.warning(f"Gemini formatting timed out, returning raw advice: {e}")
         except Exception as e:
             logging.warning(f"Gemini formatting failed, returning raw advice: {e}")
 
-    # ---- Save to test history ----
-    from datetime import datetime
-    record = {
-        "id": len(test_history) + 1,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        "sensor": {
-            "ph": avg_ph, "temp": avg_temp,
-            "moisture": avg_moisture, "humidity": avg_humidity
-        },
-        "practices": {
-            "crop": crop, "irrigation": irrigation, "fertilizer": fertilizer
-        },
-        "shrs": shrs,
-        "env_risk": env_risk,
-        "practice_risk": practice_risk,
-        "trend": trend,
-        "recommendation": result["recommendation"]
-    }
-    test_history.append(record)
 
-    return jsonify(result)
+    return jsonify_fields(result)
+
+@app.route("/ai-recommendation/jobs/<job_id>")
+def ai_recommendation_job(job_id):
+    text = recommendation_cache.get(job_id)
+    if text:
+        return jsonify({"status": "done", "recommendation": text, "source": "gemini_formatted"})
+    status, error = llm_runner.status(job_id)
+    if status == "pending":
+        return jsonify({"status": "pending"})
+    if status == "failed":
+        return jsonify({"status": "failed", "error": error})
+    # Still running on another worker, finished with LLM_CACHE_PATH empty,
+    # expired, or never submitted
+    return jsonify({"status": "unknown"}), 404
 
 # -------------------------------------------------
 # TEST HISTORY
 # -------------------------------------------------
 @app.route("/history")
 def get_history():
-    return jsonify(list(reversed(test_history)))
+    """Newest-first page of records.
+
+    ?limit= page size, ?cursor= value of the previous page's X-Next-Cursor
+    header, ?view=compact leaves out the recommendation markdown,
+    ?farm_id= restricts to one farm, ?fields= picks keys per record.
+    """
+    limit = min(request.args.get("limit", HISTORY_PAGE_SIZE, type=int), HISTORY_MAX_PAGE_SIZE)
+    records, next_cursor = history_store.page(
+        limit=max(limit, 1),
+        before=request.args.get("cursor", type=int),
+        with_recommendation=request.args.get("view") != "compact",
+        farm_id=request.args.get("farm_id")
+    )
+    response = jsonify_fields(records)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response
+
+@app.route("/history/<int:record_id>")
+def get_history_record(record_id):
+    record = history_store.get(record_id)
+    if not record:
+        return jsonify({"error": "Record not found"}), 404
+    return jsonify_fields(record)
 
 @app.route("/history/clear", methods=["POST"])
 def clear_history():
-    global test_history
-    test_history = []
+    history_store.clear()
+    timeseries.clear()
+    cohort_percentiles.clear()
     return jsonify({"status": "cleared"})
 
+# -------------------------------------------------
+# LONG-HORIZON TRENDS (precomputed rollups)
+# -------------------------------------------------
+@app.route("/trend/<farm_id>")
+def get_trend(farm_id):
+    """Trend of one metric over the last ?window= buckets.
+
+    ?metric= one of shrs, avg_ph, avg_temp, avg_moisture, avg_humidity;
+    ?granularity= hour, day or season.
+    """
+    metric = request.args.get("metric", "shrs")
+    granularity = request.args.get("granularity", "day")
+    window = request.args.get("window", 30, type=int)
+    if metric not in METRICS:
+        return jsonify({"error": f"metric must be one of {', '.join(METRICS)}"}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+    window = max(1, min(window, TREND_MAX_WINDOW))
+    return jsonify_fields(timeseries.trend(farm_id, metric, granularity, window))
+
+# -------------------------------------------------
+# COHORT PERCENTILES
+# -------------------------------------------------
+@app.route("/percentile/<farm_id>")
+def get_percentile(farm_id):
+    """How the farm's latest assessment ranks among fields with the same
+    crop and irrigation regime, and across the fleet.
+
+    ?metric= one of shrs, avg_ph, avg_temp, avg_moisture, avg_humidity
+    (default: all). A higher SHRS percentile means higher risk than most.
+    """
+    metric = request.args.get("metric")
+    if metric is not None and metric not in SKETCH_SPECS:
+        return jsonify({"error": f"metric must be one of {', '.join(SKETCH_SPECS)}"}), 400
+    records, _ = history_store.page(limit=1, with_recommendation=False, farm_id=farm_id)
+    if not records:
+        return jsonify({"error": "No assessments for this farm"}), 404
+    record = records[0]
+    sensor, practices = record["sensor"], record["practices"]
+    values = {
+        "shrs": record["shrs"], "avg_ph": sensor["ph"], "avg_temp": sensor["temp"],
+        "avg_moisture": sensor["moisture"], "avg_humidity": sensor["humidity"]
+    }
+    if metric is not None:
+        values = {metric: values[metric]}
+    return jsonify_fields({
+        "farm_id": farm_id,
+        "record_id": record["id"],
+        "timestamp": record["timestamp"],
+        "crop": practices["crop"],
+        "irrigation": practices["irrigation"],
+        "metrics": cohort_percentiles.rank(practices["crop"], practices["irrigation"], values)
+    })
+
+# -------------------------------------------------
+# STANDING ALERTS (rules + outbox)
+# -------------------------------------------------
+@app.route("/alerts/rules", methods=["GET"])
+def list_alert_rules():
+    """Rules, oldest first; ?owner= restricts to one user or farm."""
+    return jsonify_fields([r.to_dict() for r in alert_engine.rules(request.args.get("owner"))])
+
+
+@app.route("/alerts/rules", methods=["POST"])
+def create_alert_rule():
+    """Register a rule.
+
+    Body: owner (user or farm id), sensor (soil_ph, soil_temp,
+    soil_moisture, air_humidity), kind (below, above, outside, inside),
+    threshold for below/above or low + high for a band, optional
+    consecutive (default 1) and device_id (default: every device).
+    """
+    data = request.get_json(silent=True) or {}
+    kind = data.get("kind")
+    low, high = data.get("low"), data.get("high")
+    if kind == "below":
+        high = data.get("threshold", high)
+    elif kind == "above":
+        low = data.get("threshold", low)
+    try:
+        rule = alert_engine.add_rule(
+            owner=str(data.get("owner") or data.get("farm_id") or DEFAULT_FARM),
+            sensor=data.get("sensor"), kind=kind, low=low, high=high,
+            consecutive=data.get("consecutive", 1),
+            device_id=str(data["device_id"]) if data.get("device_id") else None
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(rule.to_dict()), 201
+
+
+@app.route("/alerts/rules/<int:rule_id>", methods=["DELETE"])
+def delete_alert_rule(rule_id):
+    if not alert_engine.delete_rule(rule_id):
+        return jsonify({"error": "Rule not found"}), 404
+    return jsonify({"status": "deleted"})
+
+
+@app.route("/alerts/outbox")
+def get_alert_outbox():
+    """Undelivered alerts, oldest first.
+
+    ?owner= restricts to one user or farm, ?after= returns ids above a
+    previous page's last id, ?all=1 includes delivered alerts.
+    """
+    limit = min(request.args.get("limit", ALERT_OUTBOX_PAGE_SIZE, type=int),
+                ALERT_OUTBOX_MAX_PAGE_SIZE)
+    return jsonify_fields(alert_engine.outbox(
+        owner=request.args.get("owner"),
+        after=request.args.get("after", 0, type=int),
+        limit=max(limit, 1),
+        pending=request.args.get("all") != "1"
+    ))
+
+
+@app.route("/alerts/outbox/ack", methods=["POST"])
+def ack_alerts():
+    """Mark alerts delivered: {"ids": [...]}."""
+    ids = (request.get_json(silent=True) or {}).get("ids")
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        return jsonify({"error": "ids must be a list of alert ids"}), 400
+    return jsonify({"acknowledged": alert_engine.ack(ids)})
+
 # -------------------------------------------------
 # TRANSLATION ROUTE
 # -------------------------------------------------
@@ -550,11 +1161,27 @@ def translate_text():
     data = request.json
     text = data.get("text")
     language = data.get("language")
+    report = data.get("report")
 
-    if not text or not language:
+    if not language or not (text or report):
         return jsonify({"error": "Missing text or language"}), 400
 
-    if not client:
+    # Deterministic reports are assembled from the pre-translated catalog
+    if report:
+        translated = build_translated_report(report, language, translation_catalog)
+        if translated:
+            return jsonify({"translated": translated, "source": "catalog"})
+        if not text:
+            text = build_report(report)
+            if not text:
+                return jsonify({"error": "Invalid report"}), 400
+
+    key = cache_key(TRANSLATION_MODEL, language, text)
+    cached = translation_cache.get(key)
+    if cached:
+        return jsonify({"translated": cached, "source": "cache"})
+
+    if not ai_enabled:
         return jsonify({"error": "AI service not configured. Set GEMINI_API_KEY."}), 503
 
     prompt = f"""Translate the following agricultural advisory text into {language}.
@@ -568,17 +1195,52 @@ Rules:
 Text to translate:
 {text}"""
 
+    def translate():
+        return generate_text(TRANSLATION_MODEL, prompt)
+
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
-        translated = response.candidates[0].content.parts[0].text.strip()
-        return jsonify({"translated": translated})
+        future = llm_runner.submit(key, translate,
+                                   on_done=lambda t: translation_cache.set(key, t))
+        translated = llm_runner.wait(future)
+        return jsonify({"translated": translated, "source": "gemini"})
+    except (CircuitOpen, Busy, TimeoutError) as e:
+        logging.warning(f"Translation skipped: {e}")
+        return jsonify({"error": "Translation service busy. Please try again shortly."}), 503
     except Exception as e:
         logging.error(f"Translation failed: {e}")
         return jsonify({"error": f"Translation failed: {str(e)}"}), 500
 
+# -------------------------------------------------
+# METRICS ENDPOINT
+# -------------------------------------------------
+metrics.describe("llm_cache_entries", "gauge", "Entries in the in-memory LLM caches")
+metrics.describe("farm_state_entries", "gauge", "Farms held in the in-memory state cache")
+metrics.describe("farm_state_bytes", "gauge", "Approximate size of the farm state cache")
+metrics.describe("reading_store_devices", "gauge", "Devices with a slot in the reading store")
+metrics.describe("reading_store_slots", "gauge", "Capacity of the reading store")
+metrics.describe("history_records", "gauge", "Test records in the history store")
+metrics.describe("alerts_fired_total", "counter", "Threshold alerts queued, by sensor")
+metrics.describe("alert_rules", "gauge", "Standing alert rules")
+metrics.describe("alert_outbox_pending", "gauge", "Queued alerts not yet delivered")
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    update_worker_gauges()
+    # Shared stores are the same for every worker, so they are read once here
+    shared = [
+        ("reading_store_devices", (), reading_store.devices()),
+        ("reading_store_slots", (), reading_store.slots),
+        ("history_records", (), history_store.count()),
+        ("alert_rules", (), alert_engine.count()),
+        ("alert_outbox_pending", (), alert_engine.pending()),
+    ]
+    return Response(metrics.render(shared),
+                    mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+profile.mark("routes")
+profile.report()
+
 # -------------------------------------------------
 # RUN
 # -------------------------------------------------
@@ -0,0 +1,155 @@
+import numpy as np
+
+from advice_rules import (
+    COMPILED_ADVICE, COMPILED_ENV_RISK, COMPILED_PRACTICE_RISK, OPS, PRACTICE_FIELDS,
+    SENSOR_FIELDS
+)
+
+# -------------------------------------------------
+# VECTORIZED BATCH RISK SCORING
+# -------------------------------------------------
+# Column-at-a-time evaluation of the compiled rule tables in advice_rules,
+# i.e. the same thresholds as /summary, compute_practice_risk and
+# generate_structured_advice — only evaluated for thousands of fields per
+# call instead of one.
+
+# Advice rule hits, per category. Index into the tuple; -1 = no advice.
+ADVICE_RULES = {
+    category: tuple(rule.rule_id for rule in rules)
+    for category, rules in COMPILED_ADVICE
+}
+
+
+def _floats(field, values):
+    """Sensor column → float64 array; ValueError naming the first bad entry.
+
+    NumPy would turn None into NaN and keep NaN/inf, and every comparison
+    with NaN is false — the row would silently score as in range.
+    """
+    try:
+        column = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        column = None
+    if column is None or column.ndim != 1:
+        bad = next((i for i, v in enumerate(values)
+                    if isinstance(v, (list, tuple, dict)) or not _is_number(v)), 0)
+        raise ValueError(f"{field}[{bad}] must be a finite number")
+    bad = np.flatnonzero(~np.isfinite(column))
+    if bad.size:
+        raise ValueError(f"{field}[{bad[0]}] must be a finite number")
+    return column
+
+
+def _is_number(value):
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _factorize(values):
+    """Practice column → (codes, lower-cased distinct values; None stays None).
+
+    Practice columns hold a handful of distinct strings, so each distinct
+    value is lowered once and every comparison is a table lookup by code.
+    """
+    distinct = list(set(values))
+    index = {v: i for i, v in enumerate(distinct)}
+    codes = np.fromiter(map(index.__getitem__, values), dtype=np.intp, count=len(values))
+    return codes, [None if v is None else str(v).lower() for v in distinct]
+
+
+class _Columns:
+    """Lazily converted input columns plus cached practice comparisons."""
+
+    def __init__(self, columns):
+        self.raw = columns
+        self.cache = {}
+
+    def mask(self, field, op, value):
+        op = OPS[op]
+        if field in SENSOR_FIELDS:
+            if field not in self.cache:
+                self.cache[field] = _floats(field, self.raw[field])
+            return op(self.cache[field], value)
+        key = (field, value)
+        if key not in self.cache:
+            if field not in self.cache:
+                self.cache[field] = _factorize(self.raw[field])
+            codes, distinct = self.cache[field]
+            self.cache[key] = np.array([v == value for v in distinct], dtype=bool)[codes]
+        # ==/!= on lower-cased strings → equality mask or its inverse
+        return op(self.cache[key], True)
+
+    def holds(self, checks, n):
+        mask = np.ones(n, dtype=bool)
+        for field, op, value in checks:
+            mask &= self.mask(field, op, value)
+        return mask
+
+
+def _score_batch(compiled, cols, n):
+    total = np.zeros(n, dtype=np.int64)
+    for _, rules in compiled:
+        masks = [cols.holds(rule.checks, n) for rule in rules]
+        total += np.select(masks, [rule.points for rule in rules], 0)
+    return total
+
+
+def _advice_batch(cols, n):
+    hits = {}
+    for category, rules in COMPILED_ADVICE:
+        masks = [cols.holds(rule.checks, n) for rule in rules]
+        hits[category] = np.select(masks, list(range(len(rules))), -1).astype(np.int8)
+    return hits
+
+
+def score_batch(avg_ph, avg_temp, avg_moisture, avg_humidity,
+                crop=None, irrigation=None, fertilizer=None):
+    """Env risk, practice risk, merged SHRS and advice hits for many fields.
+
+    All arguments are equal-length sequences (columns). Returns a dict of
+    NumPy arrays; see ADVICE_RULES for decoding the advice hits. Raises
+    ValueError naming the column (and index) of bad input.
+    """
+    raw = {
+        "avg_ph": avg_ph, "avg_temp": avg_temp,
+        "avg_moisture": avg_moisture, "avg_humidity": avg_humidity,
+        "crop": crop, "irrigation": irrigation, "fertilizer": fertilizer,
+    }
+    for name, column in raw.items():
+        if not isinstance(column, (list, tuple, np.ndarray)) and (
+                column is not None or name in SENSOR_FIELDS):
+            raise ValueError(f"{name} must be a list")
+    n = len(avg_ph)
+    for name in PRACTICE_FIELDS:
+        if raw[name] is None:
+            raw[name] = [None] * n
+    for name, column in raw.items():
+        if len(column) != n:
+            raise ValueError(f"{name} has {len(column)} values, expected {n} (avg_ph)")
+
+    cols = _Columns(raw)
+    for field in SENSOR_FIELDS:
+        # Validate every sensor column before scoring anything
+        cols.cache[field] = _floats(field, raw[field])
+    env_risk = _score_batch(COMPILED_ENV_RISK, cols, n)
+    practice_risk = _score_batch(COMPILED_PRACTICE_RISK, cols, n)
+    return {
+        "env_risk": env_risk,
+        "practice_risk": practice_risk,
+        "shrs": np.minimum(env_risk + practice_risk, 100),
+        "advice": _advice_batch(cols, n),
+    }
+
+
+def decode_advice(hits):
+    """Advice hit arrays → per-field lists of rule ids (JSON friendly)."""
+    n = len(next(iter(hits.values())))
+    fields = [[] for _ in range(n)]
+    for category, codes in hits.items():
+        labels = ADVICE_RULES[category]
+        for i in np.flatnonzero(codes >= 0):
+            fields[i].append(labels[codes[i]])
+    return fields
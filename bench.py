@@ -0,0 +1,454 @@
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from startup_profile import rss_bytes
+
+# -------------------------------------------------
+# LOAD TESTS + MICRO-BENCHMARKS
+# -------------------------------------------------
+# Drives the Flask app in-process (test client, one per worker thread)
+# with a local stand-in for genai.Client, so runs are repeatable and free:
+#
+#     python bench.py                                  # all routes + micro
+#     python bench.py --routes recommendation,translate --concurrency 16
+#     python bench.py --llm-latency 0.8 --llm-failure-rate 0.1
+#     python bench.py --json run.json                  # save results
+#     python bench.py --baseline run.json              # exit 1 on regression
+#
+# All state (history DB, reading store, LLM caches) lives in a temporary
+# directory, so a run never touches real data.
+
+ROUTES = ("ingest", "summary", "recommendation", "history", "translate")
+CROPS = ("rice", "wheat", "maize", "cotton", "")
+IRRIGATION = ("irregular", "weekly", "alternate days", "daily")
+FERTILIZER = ("none", "rare", "monthly", "weekly")
+
+
+# -------------------------------------------------
+# FAKE GEMINI CLIENT
+# -------------------------------------------------
+class _Part:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Content:
+    def __init__(self, text):
+        self.parts = [_Part(text)]
+
+
+class _Candidate:
+    def __init__(self, text):
+        self.content = _Content(text)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.candidates = [_Candidate(text)]
+
+    @property
+    def text(self):
+        return self.candidates[0].content.parts[0].text
+
+
+class FakeModels:
+    def __init__(self, latency, jitter, failure_rate, seed):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("fake Gemini failure")
+        if config and config.get("response_mime_type") == "application/json":
+            # Batch prompt from llm_batch: answer every request in it
+            requests = json.loads(contents.rsplit("\n\n", 1)[1])
+            return FakeResponse(json.dumps({"results": [
+                {"id": r["id"], "text": f"## Formatted by {model}\n\n{r['prompt'][-400:]}"}
+                for r in requests
+            ]}))
+        return FakeResponse(f"## Formatted by {model}\n\n{contents[-400:]}")
+
+
+class FakeGenaiClient:
+    """Stand-in for genai.Client: fixed latency ± jitter, random failures."""
+
+    def __init__(self, latency=0.3, jitter=0.1, failure_rate=0.0, seed=0):
+        self.models = FakeModels(latency, jitter, failure_rate, seed)
+
+
+# -------------------------------------------------
+# MEASUREMENT
+# -------------------------------------------------
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class PeakRSS:
+    """Samples RSS in the background; peak growth over the starting RSS."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            current = rss_bytes()
+            if current and current > self.peak:
+                self.peak = current
+
+    def __enter__(self):
+        if self.start is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    @property
+    def growth(self):
+        return None if self.start is None else self.peak - self.start
+
+
+def run_route(app, name, request_fn, total, concurrency, warmup):
+    """Fire `total` requests from `concurrency` threads; latency stats."""
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        for i in range(warmup):
+            request_fn(client, -1 - i)
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            status = request_fn(client, i).status_code
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    with PeakRSS() as memory:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for f in [pool.submit(worker) for _ in range(concurrency)]:
+                f.result()
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        "route": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "throughput_rps": round(total / wall, 1) if wall else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+        "peak_rss_growth_mb": None if memory.growth is None
+                              else round(memory.growth / 2**20, 2),
+    }
+
+
+# -------------------------------------------------
+# ROUTE SCENARIOS
+# -------------------------------------------------
+def make_scenarios(app_module, args):
+    rng = random.Random(args.seed)
+    # A fixed pool of distinct inputs, so cache hit rates are comparable
+    # between runs: `--distinct` different sensor/practice combinations.
+    samples = [
+        {
+            "avg_ph": round(rng.uniform(4.5, 8.5), 2),
+            "avg_temp": round(rng.uniform(8, 40), 2),
+            "avg_moisture": round(rng.uniform(10, 90), 2),
+            "avg_humidity": round(rng.uniform(20, 95), 2),
+            "crop": rng.choice(CROPS),
+            "irrigation": rng.choice(IRRIGATION),
+            "fertilizer": rng.choice(FERTILIZER),
+            "risk_score": rng.randint(0, 60),
+        }
+        for _ in range(args.distinct)
+    ]
+    for device in range(args.devices):
+        app_module.reading_store.start_session(f"bench-{device}")
+
+    def ingest(client, i):
+        s = samples[i % len(samples)]
+        return client.post("/data", json={
+            "device_id": f"bench-{i % args.devices}",
+            "soil_ph": s["avg_ph"], "soil_temp": s["avg_temp"],
+            "soil_moisture": s["avg_moisture"], "air_humidity": s["avg_humidity"],
+        })
+
+    def summary(client, i):
+        return client.get(f"/summary?device=bench-{i % args.devices}")
+
+    def recommendation(client, i):
+        body = dict(samples[i % len(samples)], farm_id=f"bench-farm-{i % args.farms}")
+        return client.post("/ai-recommendation", json=body)
+
+    newest = [0]
+
+    def history(client, i):
+        cursor = rng.randint(1, newest[0]) if newest[0] and i % 2 else None
+        query = "/history?view=compact&limit=50"
+        if cursor:
+            query += f"&cursor={cursor}"
+        return client.get(query)
+
+    texts = [f"- Apply lime to raise pH ({s['avg_ph']}).\n- Mulch to keep moisture "
+             f"near {s['avg_moisture']}%." for s in samples]
+
+    def translate(client, i):
+        return client.post("/translate", json={
+            "text": texts[i % len(texts)],
+            "language": ("Hindi", "Telugu", "Tamil", "Kannada")[i % 4],
+        })
+
+    def seed_history():
+        store = app_module.history_store
+        missing = args.history_size - store.count()
+        if missing > 0:
+            now = time.time()
+            store.add_many(
+                {
+                    "created": now - n,
+                    "timestamp": time.strftime("%Y-%m-%d %H:%M", time.localtime(now - n)),
+                    "sensor": {"ph": s["avg_ph"], "temp": s["avg_temp"],
+                               "moisture": s["avg_moisture"], "humidity": s["avg_humidity"]},
+                    "practices": {"crop": s["crop"], "irrigation": s["irrigation"],
+                                  "fertilizer": s["fertilizer"]},
+                    "shrs": s["risk_score"], "env_risk": s["risk_score"], "practice_risk": 0,
+                    "trend": "Stable", "recommendation": texts[n % len(texts)],
+                    "farm_id": f"bench-farm-{n % args.farms}",
+                }
+                for n in range(missing)
+                for s in (samples[n % len(samples)],)
+            )
+        records, _ = store.page(limit=1, with_recommendation=False)
+        newest[0] = records[0]["id"] if records else 0
+
+    return {
+        "ingest": (ingest, None),
+        "summary": (summary, None),
+        "recommendation": (recommendation, None),
+        "history": (history, seed_history),
+        "translate": (translate, None),
+    }
+
+
+# -------------------------------------------------
+# MICRO-BENCHMARKS
+# -------------------------------------------------
+def micro_benchmarks(app_module, seed, repeat=5):
+    """Best-of-`repeat` nanoseconds per call for the hot pure functions."""
+    from advice_rules import (
+        compute_env_risk, compute_practice_risk, advice_rule_hits, generate_structured_advice
+    )
+    from batch_scoring import score_batch
+
+    rng = random.Random(seed)
+    inputs = [
+        (rng.uniform(4.5, 8.5), rng.uniform(8, 40), rng.uniform(10, 90), rng.uniform(20, 95),
+         rng.choice(CROPS), rng.choice(IRRIGATION), rng.choice(FERTILIZER))
+        for _ in range(256)
+    ]
+    histories = [[rng.randint(0, 100) for _ in range(5)] for _ in range(256)]
+    columns = list(zip(*(inputs * 40)))   # 10,240 rows
+
+    def cycle(fn):
+        def run():
+            for row in inputs:
+                fn(*row)
+        return run, len(inputs)
+
+    cases = {
+        "compute_env_risk": cycle(lambda p, t, m, h, *_: compute_env_risk(p, t, m, h)),
+        "compute_practice_risk": cycle(lambda *r: compute_practice_risk(*r[4:])),
+        "advice_rule_hits": cycle(advice_rule_hits),
+        "generate_structured_advice": cycle(generate_structured_advice),
+        "detect_risk_trend": (
+            lambda: [app_module.detect_risk_trend(h) for h in histories], len(histories)),
+        "score_batch (per row)": (lambda: score_batch(*columns), len(columns[0])),
+    }
+
+    results = {}
+    for name, (fn, calls) in cases.items():
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results[name] = round(best / calls * 1e9, 1)
+    return results
+
+
+# -------------------------------------------------
+# REPORTING
+# -------------------------------------------------
+def print_routes(results):
+    header = f"{'route':<16}{'req':>7}{'conc':>6}{'rps':>10}{'p50 ms':>10}" \
+             f"{'p95 ms':>10}{'p99 ms':>10}{'peak MB':>9}  status"
+    print(header)
+    print("-" * len(header))
+    fmt = lambda v: "-" if v is None else v
+    for r in results:
+        print(f"{r['route']:<16}{r['requests']:>7}{r['concurrency']:>6}"
+              f"{fmt(r['throughput_rps']):>10}{fmt(r['p50_ms']):>10}{fmt(r['p95_ms']):>10}"
+              f"{fmt(r['p99_ms']):>10}{fmt(r['peak_rss_growth_mb']):>9}  {r['status']}")
+
+
+def print_micro(results):
+    print(f"\n{'function':<30}{'ns/call':>12}")
+    print("-" * 42)
+    for name, ns in results.items():
+        print(f"{name:<30}{ns:>12}")
+
+
+def regressions(current, baseline, tolerance):
+    """Routes whose p95 and functions whose ns/call grew beyond tolerance."""
+    found = []
+    old_routes = {r["route"]: r for r in baseline.get("routes", [])}
+    for r in current.get("routes", []):
+        old = old_routes.get(r["route"])
+        if old and old.get("p95_ms") and r.get("p95_ms") \
+                and r["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            found.append(f"{r['route']}: p95 {old['p95_ms']} → {r['p95_ms']} ms")
+    for name, ns in current.get("micro", {}).items():
+        old = baseline.get("micro", {}).get(name)
+        if old and ns > old * (1 + tolerance):
+            found.append(f"{name}: {old} → {ns} ns/call")
+    return found
+
+
+# -------------------------------------------------
+# MAIN
+# -------------------------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load tests and micro-benchmarks")
+    parser.add_argument("--routes", default=",".join(ROUTES),
+                        help=f"comma-separated subset of {', '.join(ROUTES)}")
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per thread")
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--farms", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=64,
+                        help="distinct request bodies (controls LLM cache hit rate)")
+    parser.add_argument("--history-size", type=int, default=100_000)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.1, help="± seconds")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-timeout", type=float, default=20,
+                        help="GEMINI_TIMEOUT for the app under test")
+    parser.add_argument("--no-micro", action="store_true", help="skip micro-benchmarks")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare with an earlier --json file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown vs. baseline (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def load_app(workdir, args):
+    """Import app.py against throwaway storage and the fake Gemini client."""
+    os.environ.update({
+        "HISTORY_DB_PATH": os.path.join(workdir, "history.db"),
+        "READING_STORE_PATH": os.path.join(workdir, "readings.bin"),
+        "METRICS_DIR": os.path.join(workdir, "metrics"),
+        "GEMINI_TIMEOUT": str(args.llm_timeout),
+    })
+    # Empty rather than unset, so a local .env cannot fill them in
+    os.environ["GEMINI_API_KEY"] = ""
+    os.environ["LLM_CACHE_PATH"] = ""
+    logging.disable(logging.ERROR)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+
+    app_module.ai_enabled = True
+    app_module.client = FakeGenaiClient(
+        latency=args.llm_latency, jitter=args.llm_jitter,
+        failure_rate=args.llm_failure_rate, seed=args.seed
+    )
+    return app_module
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    selected = [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = set(selected) - set(ROUTES)
+    if unknown:
+        sys.exit(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix="vasuda-bench-") as workdir:
+        app_module = load_app(workdir, args)
+        scenarios = make_scenarios(app_module, args)
+
+        results = {"config": vars(args), "routes": []}
+        for name in selected:
+            request_fn, setup = scenarios[name]
+            if setup:
+                setup()
+            results["routes"].append(run_route(
+                app_module.app, name, request_fn, args.requests, args.concurrency, args.warmup))
+        fake = app_module.client.models
+        results["llm_calls"] = dict(app_module.gemini.stats, upstream=fake.calls,
+                                    failures=fake.failures)
+        print_routes(results["routes"])
+        print(f"\nfake Gemini: {fake.calls} calls, {fake.failures} failures; "
+              f"coalescer: {app_module.gemini.stats}")
+
+        if not args.no_micro:
+            results["micro"] = micro_benchmarks(app_module, args.seed)
+            print_micro(results["micro"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        if found:
+            print("\nRegressions:")
+            for line in found:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions beyond tolerance.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+# -------------------------------------------------
+# PER-FARM ASSESSMENT STATE
+# -------------------------------------------------
+# Trend detection and practice-escalation checks need a little state per
+# farm: the last few SHRS values and the previous practice inputs. It is
+# held in a bounded LRU; evicted or unknown farms are restored lazily from
+# the history store, which remains the source of truth.
+
+SHRS_WINDOW = 5
+ENTRY_OVERHEAD = 120   # OrderedDict node + key bookkeeping, approx. bytes
+
+
+# COMPONENT 2 — RISK TREND DETECTION
+def detect_risk_trend(shrs_history):
+    """Analyze last 3 SHRS values for trend direction."""
+    if len(shrs_history) < 3:
+        return "Insufficient Data"
+    last_three = shrs_history[-3:]
+    if last_three[2] > last_three[1] > last_three[0]:
+        return "Increasing Risk"
+    elif last_three[2] < last_three[1] < last_three[0]:
+        return "Decreasing Risk"
+    return "Stable"
+
+
+class FarmState:
+    """Compact state of one farm. SHRS values (0–100) are packed as bytes."""
+
+    __slots__ = ("shrs", "irrigation", "fertilizer", "crop", "last_id", "touched")
+
+    def __init__(self, shrs=b"", irrigation=None, fertilizer=None, crop=None, last_id=0):
+        self.shrs = bytes(shrs)
+        self.irrigation = sys.intern(irrigation) if irrigation else irrigation
+        self.fertilizer = sys.intern(fertilizer) if fertilizer else fertilizer
+        self.crop = sys.intern(crop) if crop else crop
+        self.last_id = last_id
+        self.touched = time.monotonic()
+
+    @property
+    def shrs_history(self):
+        return list(self.shrs)
+
+    def record(self, shrs, irrigation, fertilizer, crop, record_id):
+        """Fold one assessment into the state."""
+        self.shrs = (self.shrs + bytes([max(0, min(int(shrs), 100))]))[-SHRS_WINDOW:]
+        self.irrigation = sys.intern(irrigation) if irrigation else irrigation
+        self.fertilizer = sys.intern(fertilizer) if fertilizer else fertilizer
+        self.crop = sys.intern(crop) if crop else crop
+        self.last_id = record_id
+
+    def size(self):
+        # Fixed per-entry estimate (full SHRS window) so accounting never drifts
+        return sys.getsizeof(self) + sys.getsizeof(bytes(SHRS_WINDOW)) + ENTRY_OVERHEAD
+
+
+class FarmStateCache:
+    """LRU of FarmState with a memory ceiling and idle eviction.
+
+    `loader(farm_id)` restores a farm from durable storage (or returns a
+    fresh FarmState); `version(farm_id)` returns the id of the farm's
+    latest stored record, so state cached here is reloaded when another
+    worker has assessed the same farm in the meantime.
+    """
+
+    def __init__(self, loader, version=None, max_bytes=64 * 1024 * 1024, idle_ttl=3600):
+        self.loader = loader
+        self.version = version
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.bytes = 0
+        self._farms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._farms)
+
+    def get(self, farm_id):
+        with self._lock:
+            state = self._farms.get(farm_id)
+        if state is not None and self.version and self.version(farm_id) != state.last_id:
+            state = None
+        if state is None:
+            state = self.loader(farm_id)
+            self.put(farm_id, state)
+        else:
+            with self._lock:
+                if farm_id in self._farms:
+                    self._farms.move_to_end(farm_id)
+        state.touched = time.monotonic()
+        return state
+
+    def put(self, farm_id, state):
+        with self._lock:
+            old = self._farms.pop(farm_id, None)
+            if old is not None:
+                self.bytes -= old.size() + sys.getsizeof(farm_id)
+            self._farms[farm_id] = state
+            self.bytes += state.size() + sys.getsizeof(farm_id)
+            self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._farms:
+            farm_id, state = next(iter(self._farms.items()))
+            over_budget = self.bytes > self.max_bytes and len(self._farms) > 1
+            idle = self.idle_ttl and now - state.touched > self.idle_ttl
+            if not (over_budget or idle):
+                break
+            del self._farms[farm_id]
+            self.bytes -= state.size() + sys.getsizeof(farm_id)
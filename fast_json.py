@@ -0,0 +1,73 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional — the stdlib encoder is used instead
+    orjson = None
+
+# -------------------------------------------------
+# FAST JSON + FIELD PROJECTION
+# -------------------------------------------------
+# FastJSONProvider plugs orjson into jsonify()/request.json when it is
+# installed. Output is the same as Flask's default provider (sorted keys,
+# compact unless debugging), just produced as bytes several times faster.
+#
+# project() implements the ?fields= parameter: a comma-separated list of
+# (dotted) keys to keep, e.g. fields=id,shrs,sensor.ph. It applies to a
+# dict or to each dict of a list.
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def _options(self):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options())
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def parse_fields(spec):
+    """"id,sensor.ph" → {"id": {}, "sensor": {"ph": {}}}; None if empty."""
+    tree = {}
+    for path in (spec or "").split(","):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for key in path.split("."):
+            node = node.setdefault(key, {})
+    return tree or None
+
+
+def _pick(value, tree):
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [_pick(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: _pick(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+
+def project(data, spec):
+    """Keep only the fields named in `spec` (see parse_fields)."""
+    tree = parse_fields(spec)
+    return _pick(data, tree) if tree else data
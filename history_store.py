@@ -0,0 +1,356 @@
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from datetime import datetime
+
+# -------------------------------------------------
+# DURABLE TEST HISTORY (SQLite, WAL mode)
+# -------------------------------------------------
+# One row per test, keyed by id and indexed by creation time. WAL lets
+# every gunicorn worker append and read concurrently. Listing is keyset
+# paginated (id < cursor), so a page costs the same at any history size.
+#
+# Rows are kept compact so more history fits in each worker's page cache:
+#
+# - crop / irrigation / fertilizer / trend are small integer codes into a
+#   `labels` table (the values are free text, so the enum is built as
+#   new values arrive);
+# - the display timestamp is derived from the `created` epoch on read;
+# - recommendation markdown is cut into fragments (lines and sentences),
+#   each stored once in `fragments`; a row keeps only the packed fragment
+#   ids and the text is rebuilt on read. Reports repeat the same advice
+#   sentences, so most of a recommendation is shared with other rows.
+#   LLM text (update_recommendation) rarely repeats, so it is stored whole
+#   instead of adding fragments nothing else will share.
+#
+# clear() drops the labels and fragments along with the tests and bumps
+# the `generation` counter. Every write transaction checks it first, so a
+# worker drops its text → id caches before it could store ids from before
+# the clear. Label and fragment ids are AUTOINCREMENT and never reused, so
+# cached id → text entries stay correct without a check.
+#
+# The number of tests is kept in `counters` by add / add_many / clear, so
+# count() (scraped by /metrics) is one row read rather than a table scan.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    ph REAL, temp REAL, moisture REAL, humidity REAL,
+    crop INTEGER, irrigation INTEGER, fertilizer INTEGER,
+    shrs INTEGER, env_risk INTEGER, practice_risk INTEGER,
+    trend INTEGER,
+    recommendation BLOB,
+    farm_id TEXT
+);
+CREATE INDEX IF NOT EXISTS tests_created ON tests (created);
+CREATE INDEX IF NOT EXISTS tests_farm ON tests (farm_id, id);
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS fragments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hash INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fragments_hash ON fragments (hash);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+SUMMARY_COLUMNS = (
+    "id, created, ph, temp, moisture, humidity, crop, irrigation, fertilizer, "
+    "shrs, env_risk, practice_risk, trend, farm_id"
+)
+LABEL_COLUMNS = (6, 7, 8, 12)     # crop, irrigation, fertilizer, trend in a summary row
+
+STORED_COLUMNS = (
+    "created, ph, temp, moisture, humidity, crop, irrigation, fertilizer, "
+    "shrs, env_risk, practice_risk, trend, recommendation, farm_id"
+)
+INSERT = f"INSERT INTO tests ({STORED_COLUMNS}) VALUES ({', '.join('?' * 14)})"
+
+# Fragment boundaries: after a newline, or after ". " / ": " / "! " / "? "
+FRAGMENT_SPLIT = re.compile(r"(?<=\n)|(?<=[.:!?] )")
+
+# Decoded labels / fragments kept per worker before the caches are reset
+CACHE_ENTRIES = 50000
+SQL_VARIABLES = 900
+
+# Recommendation blob prefix for text stored whole (fragment-id blobs start with H / I)
+RAW = b"T"
+
+
+def _to_row(record):
+    sensor, practices = record["sensor"], record["practices"]
+    return (record.get("created", time.time()),
+            sensor["ph"], sensor["temp"], sensor["moisture"], sensor["humidity"],
+            practices["crop"], practices["irrigation"], practices["fertilizer"],
+            record["shrs"], record["env_risk"], record["practice_risk"],
+            record["trend"], record["recommendation"], record.get("farm_id"))
+
+
+def timestamp_text(created):
+    return datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M")
+
+
+def _fragment_hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(),
+                          "little", signed=True)
+
+
+def _pack_ids(ids):
+    code = "H" if max(ids, default=0) < 65536 else "I"
+    return code.encode() + array(code, ids).tobytes()
+
+
+def _unpack_ids(blob):
+    ids = array(chr(blob[0]))
+    ids.frombytes(blob[1:])
+    return ids
+
+
+def _pack_raw(text):
+    return None if text is None else RAW + text.encode("utf-8")
+
+
+class HistoryStore:
+    """Test records in SQLite; one connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._label_ids, self._label_texts = {}, {}
+        self._fragment_ids, self._fragment_texts = {}, {}
+        db = self._db()
+        self._generation = None
+        db.executescript(SCHEMA)
+        db.execute("INSERT OR IGNORE INTO counters (name, value) "
+                   "SELECT 'tests', COUNT(*) FROM tests")
+        db.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('generation', 0)")
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # ---------- labels + fragments ----------
+    def _label(self, db, text):
+        if text is None:
+            return None
+        code = self._label_ids.get(text)
+        if code is None:
+            db.execute("INSERT OR IGNORE INTO labels (text) VALUES (?)", (text,))
+            code = db.execute("SELECT id FROM labels WHERE text = ?", (text,)).fetchone()[0]
+            if len(self._label_ids) >= CACHE_ENTRIES:
+                self._label_ids.clear()
+            self._label_ids[text] = code
+        return code
+
+    def _fragment(self, db, text):
+        fragment_id = self._fragment_ids.get(text)
+        if fragment_id is None:
+            digest = _fragment_hash(text)
+            for candidate, stored in db.execute(
+                    "SELECT id, text FROM fragments WHERE hash = ?", (digest,)):
+                if stored == text:
+                    fragment_id = candidate
+                    break
+            else:
+                fragment_id = db.execute("INSERT INTO fragments (hash, text) VALUES (?, ?)",
+                                         (digest, text)).lastrowid
+            if len(self._fragment_ids) >= CACHE_ENTRIES:
+                self._fragment_ids.clear()
+            self._fragment_ids[text] = fragment_id
+        return fragment_id
+
+    def _pack_text(self, db, text):
+        if text is None:
+            return None
+        return _pack_ids([self._fragment(db, f) for f in FRAGMENT_SPLIT.split(text) if f])
+
+    def _encode(self, db, row):
+        """(created, ph, temp, moisture, humidity, crop, irrigation, fertilizer, shrs,
+        env_risk, practice_risk, trend, recommendation, farm_id) → stored row."""
+        row = list(row)
+        for i in (5, 6, 7, 11):
+            row[i] = self._label(db, row[i])
+        row[12] = self._pack_text(db, row[12])
+        return row
+
+    def _lookup(self, db, table, ids):
+        """id → text cache of `table` holding all of `ids`.
+
+        A full cache is replaced rather than cleared, so readers in other
+        threads keep the dict they already filled.
+        """
+        attr = "_label_texts" if table == "labels" else "_fragment_texts"
+        cache = getattr(self, attr)
+        missing = list({i for i in ids if i is not None and i not in cache})
+        if not missing:
+            return cache
+        if len(cache) + len(missing) > CACHE_ENTRIES:
+            cache = {}
+            setattr(self, attr, cache)
+        for start in range(0, len(missing), SQL_VARIABLES):
+            chunk = missing[start:start + SQL_VARIABLES]
+            cache.update(db.execute(
+                f"SELECT id, text FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})",
+                chunk))
+        return cache
+
+    def _decode(self, db, rows, with_recommendation):
+        labels = self._lookup(db, "labels", (r[i] for r in rows for i in LABEL_COLUMNS))
+        stored = [r[14] if with_recommendation else None for r in rows]
+        blobs = [_unpack_ids(b) if b is not None and b[:1] != RAW else None for b in stored]
+        if with_recommendation:
+            texts = self._lookup(db, "fragments", (i for ids in blobs if ids for i in ids))
+        records = []
+        for row, blob, ids in zip(rows, stored, blobs):
+            record = {
+                "id": row[0],
+                "timestamp": timestamp_text(row[1]),
+                "sensor": {"ph": row[2], "temp": row[3], "moisture": row[4], "humidity": row[5]},
+                "practices": {"crop": labels.get(row[6]), "irrigation": labels.get(row[7]),
+                              "fertilizer": labels.get(row[8])},
+                "shrs": row[9],
+                "env_risk": row[10],
+                "practice_risk": row[11],
+                "trend": labels.get(row[12]),
+                "farm_id": row[13],
+            }
+            if with_recommendation:
+                if ids is not None:
+                    record["recommendation"] = "".join(texts[i] for i in ids)
+                else:
+                    record["recommendation"] = blob[1:].decode("utf-8") if blob is not None else None
+            records.append(record)
+        return records
+
+    def _check_generation(self, db):
+        """Drop the text → id caches if another worker cleared the store."""
+        generation = db.execute(
+            "SELECT value FROM counters WHERE name = 'generation'").fetchone()[0]
+        if generation != self._generation:
+            self._label_ids, self._fragment_ids = {}, {}
+            self._generation = generation
+
+    def _write(self, db, write):
+        """Run `write` in an IMMEDIATE transaction (interning reads, then inserts)."""
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._check_generation(db)
+            result = write()
+            db.commit()
+            return result
+        except Exception:
+            # Ids interned by this transaction are gone; forget them before
+            # the lock is released
+            self._label_ids.clear()
+            self._fragment_ids.clear()
+            db.rollback()
+            raise
+
+    # ---------- public API ----------
+    def _inserted(self, db, count):
+        db.execute("UPDATE counters SET value = value + ? WHERE name = 'tests'", (count,))
+
+    def add(self, record):
+        """Append a record (nested dict as returned by get). Returns its id."""
+        db = self._db()
+
+        def write():
+            record_id = db.execute(INSERT, self._encode(db, _to_row(record))).lastrowid
+            self._inserted(db, 1)
+            return record_id
+
+        return self._write(db, write)
+
+    def add_many(self, records):
+        """Append records in one transaction (bulk imports, benchmarks)."""
+        db = self._db()
+
+        def write():
+            rows = [self._encode(db, _to_row(r)) for r in records]
+            db.executemany(INSERT, rows)
+            self._inserted(db, len(rows))
+
+        self._write(db, write)
+
+    def update_recommendation(self, record_id, text):
+        """Replace a record's recommendation with LLM text (stored whole)."""
+        with self._db() as db:
+            db.execute("UPDATE tests SET recommendation = ? WHERE id = ?",
+                       (_pack_raw(text), record_id))
+
+    def get(self, record_id):
+        db = self._db()
+        row = db.execute(
+            f"SELECT {SUMMARY_COLUMNS}, recommendation FROM tests WHERE id = ?",
+            (record_id,)
+        ).fetchone()
+        return self._decode(db, [row], True)[0] if row else None
+
+    def page(self, limit=50, before=None, with_recommendation=True, farm_id=None):
+        """Newest-first records with id < before. Returns (records, next cursor)."""
+        columns = SUMMARY_COLUMNS + (", recommendation" if with_recommendation else "")
+        where, params = [], []
+        if farm_id is not None:
+            where.append("farm_id = ?")
+            params.append(farm_id)
+        if before is not None:
+            where.append("id < ?")
+            params.append(before)
+        clause = f"WHERE {' AND '.join(where)} " if where else ""
+        db = self._db()
+        rows = db.execute(
+            f"SELECT {columns} FROM tests {clause}ORDER BY id DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        records = self._decode(db, rows, with_recommendation)
+        next_cursor = records[-1]["id"] if len(records) == limit else None
+        return records, next_cursor
+
+    def latest_id(self, farm_id):
+        """Id of the farm's newest record (0 if none) — one index lookup."""
+        row = self._db().execute(
+            "SELECT MAX(id) FROM tests WHERE farm_id = ?", (farm_id,)
+        ).fetchone()
+        return row[0] or 0
+
+    def recent_for_farm(self, farm_id, limit):
+        """Newest-first (id, shrs, crop, irrigation, fertilizer) rows of a farm."""
+        db = self._db()
+        rows = db.execute(
+            "SELECT id, shrs, crop, irrigation, fertilizer FROM tests "
+            "WHERE farm_id = ? ORDER BY id DESC LIMIT ?", (farm_id, limit)
+        ).fetchall()
+        labels = self._lookup(db, "labels", (code for r in rows for code in r[2:]))
+        return [(r[0], r[1], *(labels.get(code) for code in r[2:])) for r in rows]
+
+    def count(self):
+        return self._db().execute(
+            "SELECT value FROM counters WHERE name = 'tests'").fetchone()[0]
+
+    def clear(self):
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM tests")
+            db.execute("DELETE FROM fragments")
+            db.execute("DELETE FROM labels")
+            db.execute("UPDATE counters SET value = 0 WHERE name = 'tests'")
+            db.execute("UPDATE counters SET value = value + 1 WHERE name = 'generation'")
+        self._label_ids, self._label_texts = {}, {}
+        self._fragment_ids, self._fragment_texts = {}, {}
+
@@ -0,0 +1,32 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional — responses are then gzip or identity only
+    brotli = None
+
+# -------------------------------------------------
+# CONTENT-ENCODING HELPERS
+# -------------------------------------------------
+# Shared by the pre-rendered pages (compressed once, at maximum effort)
+# and dynamic JSON responses (compressed per response, at a fast level).
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# (gzip level, brotli quality)
+STATIC_LEVELS = (9, 11)
+DYNAMIC_LEVELS = (5, 4)
+
+
+def compress(data, encoding, levels=DYNAMIC_LEVELS):
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=levels[0], mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=levels[1])
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def negotiate(request, offered=ENCODINGS):
+    """Best encoding in `offered` the client accepts, or "identity"."""
+    return request.accept_encodings.best_match(list(offered) + ["identity"],
+                                               default="identity")
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+from io import BytesIO
+
+from markupsafe import Markup, escape
+
+# -------------------------------------------------
+# RESPONSIVE IMAGE VARIANTS
+# -------------------------------------------------
+# The source PNGs in static/images are large. Running
+#
+#     python images.py build
+#
+# writes resized AVIF and WebP variants (plus a copy of the original) to
+# static/images/build/ under content-hashed names, and a manifest listing
+# them. Because a changed image gets a new name, those files are served
+# with an immutable one-year Cache-Control. Templates use
+# responsive_image(), image_url() and image_set(); without a manifest
+# they fall back to the original /static/images/ URLs.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(ROOT, "static", "images")
+BUILD_DIR = os.path.join(SOURCE_DIR, "build")
+MANIFEST_PATH = os.path.join(BUILD_DIR, "manifest.json")
+URL_PREFIX = "/static/images/"
+BUILD_URL_PREFIX = URL_PREFIX + "build/"
+
+WIDTHS = (480, 960, 1440, 1920)
+# Preferred first; the browser takes the first <source> type it supports
+FORMATS = (
+    ("avif", "image/avif", {"quality": 55, "speed": 6}),
+    ("webp", "image/webp", {"quality": 78, "method": 6}),
+)
+
+
+def _hashed_name(stem, suffix, data):
+    return f"{stem}{suffix}.{hashlib.sha256(data).hexdigest()[:10]}"
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Manifest JSON → {source name: entry}, or {} if not built."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Image manifest unreadable ({path}): {e}")
+        return {}
+
+
+def _srcset(variants):
+    return ", ".join(f"{url} {width}w" for width, url in variants)
+
+
+def responsive_image(manifest, name, alt, sizes="100vw", loading="lazy", **attrs):
+    """<picture> with AVIF/WebP srcsets and the original as fallback."""
+    entry = manifest.get(name)
+    extra = "".join(f' {k.replace("_", "-")}="{escape(v)}"' for k, v in attrs.items())
+    if not entry:
+        return Markup(f'<img src="{URL_PREFIX}{escape(name)}" alt="{escape(alt)}" '
+                      f'loading="{loading}"{extra}>')
+
+    sources = "".join(
+        f'<source type="{mime}" srcset="{_srcset(entry["variants"][fmt])}" sizes="{escape(sizes)}">'
+        for fmt, mime, _ in FORMATS if entry["variants"].get(fmt)
+    )
+    return Markup(
+        f'<picture style="display: contents">{sources}'
+        f'<img src="{entry["fallback"]}" alt="{escape(alt)}" width="{entry["width"]}" '
+        f'height="{entry["height"]}" loading="{loading}" decoding="async"{extra}>'
+        f'</picture>'
+    )
+
+
+def image_url(manifest, name):
+    """URL of the (hashed, if built) original image."""
+    entry = manifest.get(name)
+    return entry["fallback"] if entry else URL_PREFIX + name
+
+
+def image_set(manifest, name, width=1920):
+    """CSS image-set() of the variants closest to `width`, for backgrounds."""
+    entry = manifest.get(name)
+    if not entry:
+        return Markup(f"url('{URL_PREFIX}{name}')")
+    options = []
+    for fmt, mime, _ in FORMATS:
+        variants = entry["variants"].get(fmt)
+        if variants:
+            url = next((u for w, u in variants if w >= width), variants[-1][1])
+            options.append(f'url("{url}") type("{mime}")')
+    options.append(f'url("{entry["fallback"]}") type("image/png")')
+    return Markup(f"image-set({', '.join(options)})")
+
+
+# -------------------------------------------------
+# BUILD STEP
+# -------------------------------------------------
+def build_variants(path, build_dir=BUILD_DIR, widths=WIDTHS):
+    from PIL import Image, features
+
+    name = os.path.basename(path)
+    stem = os.path.splitext(name)[0]
+    with open(path, "rb") as f:
+        original = f.read()
+
+    fallback = _hashed_name(stem, "", original) + os.path.splitext(name)[1]
+    with open(os.path.join(build_dir, fallback), "wb") as f:
+        f.write(original)
+
+    with Image.open(path) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        width, height = image.size
+        targets = sorted({w for w in widths if w < width} | {min(width, max(widths))})
+        variants = {}
+        for fmt, _, options in FORMATS:
+            if not features.check(fmt):
+                logging.warning(f"Pillow lacks {fmt} support — skipping {fmt} variants")
+                continue
+            variants[fmt] = []
+            for target in targets:
+                resized = image if target == width else image.resize(
+                    (target, round(height * target / width)), Image.LANCZOS)
+                buffer = BytesIO()
+                resized.save(buffer, format=fmt.upper(), **options)
+                data = buffer.getvalue()
+                filename = _hashed_name(stem, f"-{target}w", data) + f".{fmt}"
+                with open(os.path.join(build_dir, filename), "wb") as f:
+                    f.write(data)
+                variants[fmt].append((target, BUILD_URL_PREFIX + filename))
+
+    return {
+        "width": width,
+        "height": height,
+        "fallback": BUILD_URL_PREFIX + fallback,
+        "variants": variants,
+    }
+
+
+def build(source_dir=SOURCE_DIR, build_dir=BUILD_DIR, manifest_path=MANIFEST_PATH):
+    os.makedirs(build_dir, exist_ok=True)
+    manifest = {}
+    for name in sorted(os.listdir(source_dir)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg")):
+            continue
+        path = os.path.join(source_dir, name)
+        manifest[name] = entry = build_variants(path, build_dir)
+        sizes = [os.path.getsize(os.path.join(build_dir, url.rsplit("/", 1)[1]))
+                 for fmt in entry["variants"].values() for _, url in fmt]
+        print(f"{name}: {os.path.getsize(path) // 1024} KB → "
+              f"{min(sizes) // 1024}–{max(sizes) // 1024} KB variants" if sizes else name)
+
+    # Drop variants from earlier builds that the new manifest no longer uses
+    used = {os.path.basename(manifest_path)}
+    for entry in manifest.values():
+        used.add(entry["fallback"].rsplit("/", 1)[1])
+        used.update(url.rsplit("/", 1)[1] for fmt in entry["variants"].values() for _, url in fmt)
+    for filename in os.listdir(build_dir):
+        if filename not in used:
+            os.remove(os.path.join(build_dir, filename))
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"Wrote {manifest_path}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        sys.exit("usage: python images.py build")
+    build()
@@ -0,0 +1,143 @@
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# -------------------------------------------------
+# GEMINI REQUEST COALESCING (single-flight + micro-batching)
+# -------------------------------------------------
+# Sits between the app and the Gemini client:
+#
+# - identical (model, prompt) requests that overlap share one call;
+# - distinct prompts for the same model that arrive within `window`
+#   seconds (up to `max_batch`) are sent as one structured JSON prompt
+#   and the answers are split back out. Anything the batch answer leaves
+#   out is retried as a single call, in parallel on the same pool.
+#
+# A burst of N reports then costs about N / max_batch upstream requests.
+
+BATCH_PROMPT = """You will receive {count} independent requests as a JSON array of objects with "id" and "prompt".
+Handle each request on its own, exactly as if it had been sent alone, and follow its instructions.
+
+Return a JSON object of the form {{"results": [{{"id": <id>, "text": <complete answer>}}]}} with one entry per request.
+
+{requests}"""
+BATCH_CONFIG = {"response_mime_type": "application/json"}
+
+
+def batch_prompt(prompts):
+    requests = [{"id": i, "prompt": p} for i, p in enumerate(prompts)]
+    return BATCH_PROMPT.format(count=len(prompts),
+                               requests=json.dumps(requests, ensure_ascii=False, indent=1))
+
+
+def split_batch(text, count):
+    """Batch answer → list of `count` texts (None where missing or unusable)."""
+    results = [None] * count
+    try:
+        entries = json.loads(text)["results"]
+    except (ValueError, KeyError, TypeError):
+        return results
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        index, answer = entry.get("id"), entry.get("text")
+        if isinstance(index, int) and 0 <= index < count and isinstance(answer, str) and answer.strip():
+            results[index] = answer.strip()
+    return results
+
+
+class PromptCoalescer:
+    """Single-flight and micro-batching front for `call(model, prompt, config=None)`."""
+
+    def __init__(self, call, window=0.05, max_batch=8, max_workers=4):
+        self.call = call
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = {"calls": 0, "batches": 0, "batched_prompts": 0,
+                      "coalesced": 0, "fallbacks": 0}
+        self._inflight = {}        # (model, prompt) -> Future
+        self._pending = {}         # model -> [(prompt, Future)] waiting for the window
+        self._timers = {}          # model -> Timer that flushes the pending batch
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix="llm-batch")
+        self._lock = threading.Lock()
+
+    def generate(self, model, prompt, timeout=None):
+        """Response text for `prompt`; blocks until its (shared) call finishes."""
+        return self.submit(model, prompt).result(timeout=timeout)
+
+    def submit(self, model, prompt):
+        key = (model, prompt)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future
+            future = self._inflight[key] = Future()
+
+            if self.window <= 0 or self.max_batch <= 1:
+                self._pool.submit(self._run, model, [(prompt, future)])
+                return future
+            batch = self._pending.setdefault(model, [])
+            batch.append((prompt, future))
+            if len(batch) >= self.max_batch:
+                self._flush_locked(model)
+            elif len(batch) == 1:
+                timer = threading.Timer(self.window, self._flush, (model,))
+                timer.daemon = True
+                self._timers[model] = timer
+                timer.start()
+        return future
+
+    def _flush(self, model):
+        with self._lock:
+            self._flush_locked(model)
+
+    def _flush_locked(self, model):
+        timer = self._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(model, None)
+        if batch:
+            self._pool.submit(self._run, model, batch)
+
+    def _run(self, model, batch):
+        prompts = [prompt for prompt, _ in batch]
+        try:
+            if len(batch) == 1:
+                outcomes = [self._call(model, prompts[0])]
+            else:
+                outcomes = self._call_batch(model, prompts)
+        except Exception as e:
+            outcomes = [e] * len(batch)
+
+        done, retry = [], []
+        with self._lock:
+            for (prompt, future), outcome in zip(batch, outcomes):
+                if outcome is None:
+                    # Left out of the batch answer — ask for this one alone
+                    self.stats["fallbacks"] += 1
+                    retry.append((prompt, future))
+                else:
+                    self._inflight.pop((model, prompt), None)
+                    done.append((future, outcome))
+        # Queued rather than awaited, so retries run side by side
+        for item in retry:
+            self._pool.submit(self._run, model, [item])
+        for future, outcome in done:
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def _call(self, model, prompt, config=None):
+        with self._lock:
+            self.stats["calls"] += 1
+        return self.call(model, prompt, config)
+
+    def _call_batch(self, model, prompts):
+        """Answers for `prompts` from one batch call (None where left out)."""
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["batched_prompts"] += len(prompts)
+        return split_batch(self._call(model, batch_prompt(prompts), BATCH_CONFIG), len(prompts))
@@ -0,0 +1,106 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# -------------------------------------------------
+# CONTENT-ADDRESSED LLM RESPONSE CACHE
+# -------------------------------------------------
+# Keys are SHA-256 hashes of the inputs that determine a prompt, so
+# identical assessments map to the same entry. Entries live in an LRU with
+# a TTL; with a `path`, they are also written to SQLite so they survive
+# restarts and are shared by every gunicorn worker.
+
+
+def cache_key(*parts):
+    """Stable hash of JSON-serializable inputs."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Thread-safe LRU + TTL cache with optional on-disk persistence."""
+
+    def __init__(self, max_entries=1024, ttl=7 * 24 * 3600, path=None, table="llm_cache"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> (created_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        try:
+            self._db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"LLM cache persistence disabled ({path}): {e}")
+            self._db = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _fresh(self, created):
+        return not self.ttl or time.time() - created < self.ttl
+
+    def get(self, key):
+        """Cached value for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._fresh(entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+
+            if self._db:
+                try:
+                    row = self._db.execute(
+                        f"SELECT created, value FROM {self.table} WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logging.warning(f"LLM cache read failed: {e}")
+                    row = None
+                if row and self._fresh(row[0]):
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    return row[1]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, value)
+            if self._db:
+                try:
+                    self._db.execute(
+                        f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)",
+                        (key, value, created)
+                    )
+                    if self.ttl:
+                        self._db.execute(
+                            f"DELETE FROM {self.table} WHERE created < ?", (created - self.ttl,))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f"LLM cache write failed: {e}")
+
+    def _remember(self, key, created, value):
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,156 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# -------------------------------------------------
+# BOUNDED LLM EXECUTION (deadline, concurrency limit, circuit breaker)
+# -------------------------------------------------
+# Gemini calls run on a small thread pool instead of the request thread.
+# A request waits at most `timeout` seconds for the result; a call that
+# overruns keeps going in the background and still fills the cache.
+# After `failure_threshold` consecutive failures the breaker opens and
+# calls are skipped for `reset_after` seconds, then a single trial call
+# decides whether to close it again.
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling upstream while the breaker is open."""
+
+
+class Busy(Exception):
+    """Raised when too many calls are already queued."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_after=30):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """True if a call may go upstream now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LLMRunner:
+    """Runs LLM calls on a bounded pool; one in-flight call per job id."""
+
+    def __init__(self, max_workers=4, max_pending=32, timeout=20,
+                 breaker=None, max_failed=256, record_outcomes=True):
+        """`record_outcomes=False` leaves success/failure accounting to the
+        callables — when several jobs can share one upstream call, the
+        breaker must count calls, not jobs."""
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.breaker = breaker or CircuitBreaker()
+        self.record_outcomes = record_outcomes
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix="llm")
+        self._inflight = {}            # job id -> Future
+        self._failed = OrderedDict()   # job id -> error message
+        self._max_failed = max_failed
+        self._lock = threading.Lock()
+
+    def submit(self, job_id, fn, on_done=None):
+        """Start fn() for job_id (or join the running call). Returns a Future.
+
+        on_done(result) runs in the worker thread after a successful call —
+        also for callers that joined a running call, each with its own
+        on_done. Raises CircuitOpen or Busy instead of queueing more work.
+        """
+        with self._lock:
+            future = self._inflight.get(job_id)
+            if future:
+                if on_done:
+                    future.add_done_callback(
+                        lambda f: self._joined_done(job_id, f, on_done))
+                return future
+            if len(self._inflight) >= self.max_pending:
+                raise Busy("LLM queue full")
+            if not self.breaker.allow():
+                raise CircuitOpen("LLM circuit open")
+            self._failed.pop(job_id, None)
+            future = self._pool.submit(self._run, job_id, fn, on_done)
+            self._inflight[job_id] = future
+            return future
+
+    def _run(self, job_id, fn, on_done):
+        try:
+            result = fn()
+        except Exception as e:
+            if self.record_outcomes:
+                self.breaker.record_failure()
+            with self._lock:
+                self._failed[job_id] = str(e)
+                while len(self._failed) > self._max_failed:
+                    self._failed.popitem(last=False)
+            raise
+        else:
+            if self.record_outcomes:
+                self.breaker.record_success()
+            if on_done:
+                try:
+                    on_done(result)
+                except Exception as e:
+                    logging.warning(f"LLM job {job_id} callback failed: {e}")
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(job_id, None)
+
+    def _joined_done(self, job_id, future, on_done):
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            on_done(future.result())
+        except Exception as e:
+            logging.warning(f"LLM job {job_id} callback failed: {e}")
+
+    def wait(self, future, timeout=None):
+        """Result of `future` within the deadline; raises TimeoutError."""
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeout:
+            raise TimeoutError("LLM call exceeded deadline") from None
+
+    def status(self, job_id):
+        """"pending", "failed" (with error) or None if unknown here."""
+        with self._lock:
+            if job_id in self._inflight:
+                return "pending", None
+            if job_id in self._failed:
+                return "failed", self._failed[job_id]
+        return None, None
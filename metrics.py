@@ -0,0 +1,290 @@
+import os
+import glob
+import mmap
+import json
+import struct
+import bisect
+import logging
+import tempfile
+import threading
+try:
+    import fcntl
+except ImportError:        # Windows dev boxes: single process, no flock needed
+    fcntl = None
+
+# -------------------------------------------------
+# PROMETHEUS METRICS (shared across gunicorn workers)
+# -------------------------------------------------
+# Every worker process writes to its own memory-mapped file in
+# METRICS_DIR, so recording a value is a dict lookup plus a few float
+# additions under a process-local lock — no cross-process locking and no
+# syscalls. /metrics reads all files and sums them: counters and
+# histograms across every worker that ever ran (so totals stay monotonic
+# when workers are recycled), gauges across live workers only.
+#
+# Files of dead workers are folded into archive.json (their counters and
+# histograms; gauges are dropped) and deleted by the next scrape, as in
+# prometheus_client's multiprocess mode, so worker recycling does not grow
+# the directory or the work per scrape. Archiving runs under an flock on
+# .archive.lock so each file is merged exactly once.
+#
+# File layout:
+#   header | series index (append-only text) | values (float64)
+#   header = magic, pid, index length, values used
+#   index  = one "offset<TAB>kind<TAB>name<TAB>labels-json" line per series
+#
+# Clear METRICS_DIR on deploy, as with any Prometheus multiprocess setup.
+
+MAGIC = b"VMT1"
+HEADER = struct.Struct("<4sIII")          # magic, pid, index bytes, values used
+INDEX_BYTES = 64 * 1024
+MAX_VALUES = 8192
+FILE_SIZE = HEADER.size + INDEX_BYTES + MAX_VALUES * 8
+VALUES_OFFSET = HEADER.size + INDEX_BYTES
+ARCHIVE = "archive.json"
+ARCHIVE_LOCK = ".archive.lock"
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "vasuda_metrics")
+
+# Latency buckets (seconds) — request handlers and Gemini calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"'))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class Metrics:
+    """Counters, gauges and histograms recorded into a per-process file."""
+
+    def __init__(self, directory=DEFAULT_DIR, buckets=DEFAULT_BUCKETS):
+        self.directory = directory
+        self.buckets = tuple(buckets)
+        self._help = {}            # name -> (kind, help text)
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # A forked child (gunicorn --preload) gets its own file
+        self._lock = threading.Lock()
+        self._mm = None
+        self._values = None
+        self._series = {}          # (name, labels) -> value offset
+        self._index_used = 0
+        self._values_used = 0
+        self._full = False
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    # ---------- recording ----------
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"worker-{os.getpid()}.bin")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, FILE_SIZE)
+            self._mm = mmap.mmap(fd, FILE_SIZE)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self._mm, 0, MAGIC, os.getpid(), 0, 0)
+        self._values = memoryview(self._mm)[VALUES_OFFSET:].cast("d")
+
+    def _offset(self, kind, name, labels, width):
+        """Offset of a series' values, allocating them on first use."""
+        key = (name, labels)
+        offset = self._series.get(key)
+        if offset is not None:
+            return offset
+        if self._full:
+            return None
+        if self._mm is None:
+            self._open()
+        line = f"{self._values_used}\t{kind}\t{name}\t{json.dumps(labels)}\n".encode()
+        if (self._values_used + width > MAX_VALUES
+                or self._index_used + len(line) > INDEX_BYTES):
+            self._full = True
+            logging.warning(f"Metrics file full, dropping new series {name}")
+            return None
+        offset = self._values_used
+        start = HEADER.size + self._index_used
+        self._mm[start:start + len(line)] = line
+        self._index_used += len(line)
+        self._values_used += width
+        # Publish the index entry only after it has been written
+        HEADER.pack_into(self._mm, 0, MAGIC, os.getpid(),
+                         self._index_used, self._values_used)
+        self._series[key] = offset
+        return offset
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            offset = self._offset("counter", name, labels, 1)
+            if offset is not None:
+                self._values[offset] += amount
+
+    def set(self, name, labels=(), value=0):
+        with self._lock:
+            offset = self._offset("gauge", name, labels, 1)
+            if offset is not None:
+                self._values[offset] = value
+
+    def observe(self, name, labels=(), value=0):
+        """Histogram: per-bucket counts (+Inf last), then sum, then count."""
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            offset = self._offset("histogram", name, labels, len(self.buckets) + 3)
+            if offset is not None:
+                values = self._values
+                values[offset + bucket] += 1
+                values[offset + len(self.buckets) + 1] += value
+                values[offset + len(self.buckets) + 2] += 1
+
+    # ---------- exposition ----------
+    def _read_file(self, path):
+        """(pid, [(kind, name, labels, values)]) from one worker file."""
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < FILE_SIZE:
+            return None, []
+        magic, pid, index_used, values_used = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            return None, []
+        values = memoryview(data)[VALUES_OFFSET:].cast("d")
+        series = []
+        index = data[HEADER.size:HEADER.size + index_used].decode()
+        for line in index.splitlines():
+            offset, kind, name, labels = line.split("\t")
+            offset = int(offset)
+            width = len(self.buckets) + 3 if kind == "histogram" else 1
+            labels = tuple(tuple(pair) for pair in json.loads(labels))
+            series.append((kind, name, labels, list(values[offset:offset + width])))
+        return pid, series
+
+    @staticmethod
+    def _merge(merged, kind, name, labels, values):
+        family = merged.setdefault((kind, name), {})
+        current = family.get(labels)
+        family[labels] = values if current is None else [
+            a + b for a, b in zip(current, values)
+        ]
+
+    def _read_archive(self):
+        """{(kind, name): {labels: values}} folded in from dead workers."""
+        path = os.path.join(self.directory, ARCHIVE)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping metrics archive {path}: {e}")
+            return {}
+        archived = {}
+        for kind, name, labels, values in entries:
+            self._merge(archived, kind, name, tuple(tuple(pair) for pair in labels), values)
+        return archived
+
+    def _archive(self, dead):
+        """Fold dead workers' counters and histograms into the archive; delete their files."""
+        with open(os.path.join(self.directory, ARCHIVE_LOCK), "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            archived = self._read_archive()
+            merged_paths = []
+            for path in dead:
+                try:
+                    _, series = self._read_file(path)
+                except FileNotFoundError:
+                    continue           # another worker archived it first
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Skipping metrics file {path}: {e}")
+                    continue
+                for kind, name, labels, values in series:
+                    if kind != "gauge":
+                        self._merge(archived, kind, name, labels, values)
+                merged_paths.append(path)
+            if not merged_paths:
+                return
+            entries = [[kind, name, labels, values]
+                       for (kind, name), family in archived.items()
+                       for labels, values in family.items()]
+            tmp = os.path.join(self.directory, f"{ARCHIVE}.{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp, os.path.join(self.directory, ARCHIVE))
+            for path in merged_paths:
+                os.unlink(path)
+
+    def collect(self):
+        """{(kind, name): {labels: summed values}} over live workers plus the archive."""
+        merged, dead = {}, []
+        for path in glob.glob(os.path.join(self.directory, "worker-*.bin")):
+            try:
+                pid, series = self._read_file(path)
+            except FileNotFoundError:
+                continue               # archived by another worker meanwhile
+            except (OSError, ValueError) as e:
+                logging.warning(f"Skipping metrics file {path}: {e}")
+                continue
+            if pid is not None and not _pid_alive(pid):
+                dead.append(path)
+                continue
+            for kind, name, labels, values in series:
+                self._merge(merged, kind, name, labels, values)
+        if dead:
+            try:
+                self._archive(dead)
+            except OSError as e:
+                logging.warning(f"Archiving dead worker metrics failed: {e}")
+        for (kind, name), family in self._read_archive().items():
+            for labels, values in family.items():
+                self._merge(merged, kind, name, labels, values)
+        return merged
+
+    def render(self, extra_gauges=()):
+        """Prometheus text exposition; extra_gauges are (name, labels, value)."""
+        merged = self.collect()
+        for name, labels, value in extra_gauges:
+            merged.setdefault(("gauge", name), {})[tuple(labels)] = [value]
+
+        lines = []
+        for (kind, name), family in sorted(merged.items(), key=lambda item: item[0][1]):
+            help_text = self._help.get(name, (kind, name))[1]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, values in sorted(family.items()):
+                if kind != "histogram":
+                    lines.append(f"{name}{_label_text(labels)} {_format(values[0])}")
+                    continue
+                cumulative = 0
+                for le, count in zip(self.buckets + (float("inf"),), values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', _format(le)),))} "
+                                 f"{_format(cumulative)}")
+                lines.append(f"{name}_sum{_label_text(labels)} {_format(values[-2])}")
+                lines.append(f"{name}_count{_label_text(labels)} {_format(values[-1])}")
+        return "\n".join(lines) + "\n"
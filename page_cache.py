@@ -0,0 +1,72 @@
+import hashlib
+import threading
+
+from flask import Response
+
+from http_compression import ENCODINGS, STATIC_LEVELS, compress, negotiate
+
+# -------------------------------------------------
+# PRE-RENDERED STATIC PAGES
+# -------------------------------------------------
+# The homepage and blog pages depend on nothing in the request, so each is
+# rendered once, compressed once per encoding and kept as bytes. Every
+# variant carries a strong ETag (content hash + encoding), so revalidating
+# clients and CDNs get an empty 304 instead of a 50 KB body.
+
+
+def _etag(body, encoding):
+    digest = hashlib.sha256(body).hexdigest()[:20]
+    return f"{digest}-{encoding}" if encoding != "identity" else digest
+
+
+class Page:
+    """One rendered page: {encoding: (bytes, etag)} with identity always present."""
+
+    __slots__ = ("variants",)
+
+    def __init__(self, html):
+        body = html.encode("utf-8")
+        self.variants = {"identity": (body, _etag(body, "identity"))}
+        for encoding in ENCODINGS:
+            data = compress(body, encoding, STATIC_LEVELS)
+            # Keep a variant only if it actually saves bytes
+            if len(data) < len(body):
+                self.variants[encoding] = (data, _etag(body, encoding))
+
+    def respond(self, request, max_age=300):
+        """Response for `request`: best accepted encoding, 304 when unchanged."""
+        encoding = negotiate(request, [e for e in ENCODINGS if e in self.variants])
+        body, etag = self.variants[encoding]
+
+        response = Response(body, mimetype="text/html")
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+
+class PageCache:
+    """Pages by key, rendered on first use."""
+
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        page = self._pages.get(key)
+        if page is None:
+            with self._lock:
+                page = self._pages.get(key)
+                if page is None:
+                    page = self._pages[key] = Page(render())
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def __len__(self):
+        return len(self._pages)
@@ -0,0 +1,215 @@
+import math
+import zlib
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left
+
+# -------------------------------------------------
+# COHORT PERCENTILES (mergeable quantile sketches)
+# -------------------------------------------------
+# Every assessment is folded into a sketch of SHRS and each sensor
+# average, per cohort — fields with the same crop and irrigation regime —
+# and for the whole fleet. "What percentile is this field in" is then a
+# lookup in the cohort's sketch, whatever the size of the history.
+#
+# All five metrics live in fixed, known ranges, so the sketch is a
+# fixed-bucket histogram: exact for SHRS (integers 0–100) and within half
+# a bucket for the averages. Two sketches merge by adding counts, which is
+# how every worker's updates combine in the shared table. A sketch is
+# stored as zlib-compressed uint32 counts, a few hundred bytes at most.
+
+# metric -> (lowest value, highest value, bucket width)
+SKETCH_SPECS = {
+    "shrs": (0, 100, 1),
+    "avg_ph": (0, 14, 0.05),
+    "avg_temp": (-10, 60, 0.25),
+    "avg_moisture": (0, 100, 0.5),
+    "avg_humidity": (0, 100, 0.5),
+}
+FLEET = "*"
+QUARTILES = (0.25, 0.5, 0.75)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sketches (
+    cohort TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    counts BLOB NOT NULL,
+    PRIMARY KEY (cohort, metric)
+) WITHOUT ROWID;
+"""
+
+
+def cohort_key(crop, irrigation):
+    return f"{(crop or '').strip().lower()}|{(irrigation or '').strip().lower()}"
+
+
+def _finite(value):
+    return value is not None and math.isfinite(float(value))
+
+
+class BucketSketch:
+    """Histogram over SKETCH_SPECS[metric]; bucket i is centred on low + i * width."""
+
+    __slots__ = ("metric", "low", "width", "counts", "total", "_cumulative")
+
+    def __init__(self, metric, counts=None):
+        self.metric = metric
+        self.low, high, self.width = SKETCH_SPECS[metric]
+        size = round((high - self.low) / self.width) + 1
+        self.counts = counts if counts is not None else array("I", bytes(4 * size))
+        self.total = sum(self.counts)
+        self._cumulative = None
+
+    def bucket(self, value):
+        if not math.isfinite(value):
+            # ±inf land in the edge buckets (callers skip NaN)
+            return len(self.counts) - 1 if value > 0 else 0
+        i = round((value - self.low) / self.width)
+        return min(max(i, 0), len(self.counts) - 1)
+
+    def add(self, value, count=1):
+        self.counts[self.bucket(value)] += count
+        self.total += count
+        self._cumulative = None
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.total += other.total
+        self._cumulative = None
+
+    def cumulative(self):
+        """Counts strictly below each bucket (computed once per change)."""
+        if self._cumulative is None:
+            running, cumulative = 0, []
+            for c in self.counts:
+                cumulative.append(running)
+                running += c
+            self._cumulative = cumulative
+        return self._cumulative
+
+    def percentile(self, value):
+        """Share (0–100) of the sketch below `value`, counting half of its own bucket
+        for an exact match (SHRS) and interpolating within it otherwise."""
+        if not self.total:
+            return None
+        i = self.bucket(value)
+        offset = (value - self.low) / self.width - i + 0.5
+        below = self.cumulative()[i] + self.counts[i] * min(max(offset, 0.0), 1.0)
+        return 100.0 * below / self.total
+
+    def quantile(self, q):
+        """Approximate value at quantile q (0–1)."""
+        if not self.total:
+            return None
+        target = q * self.total
+        cumulative = self.cumulative()
+        # Last bucket with fewer than `target` counts below it
+        i = min(max(bisect_left(cumulative, target) - 1, 0), len(cumulative) - 1)
+        within = (target - cumulative[i]) / self.counts[i] if self.counts[i] else 0.5
+        return self.low + (i - 0.5 + min(within, 1.0)) * self.width
+
+    def to_bytes(self):
+        return zlib.compress(self.counts.tobytes(), 6)
+
+    @classmethod
+    def from_bytes(cls, metric, blob):
+        counts = array("I")
+        counts.frombytes(zlib.decompress(blob))
+        return cls(metric, counts)
+
+
+class CohortPercentiles:
+    """Sketches in SQLite, one row per (cohort, metric); one connection per thread.
+
+    Reads check only the stored total, so a worker reuses its decoded
+    sketch (and cumulative counts) until another assessment lands.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._cache = {}           # (cohort, metric) -> BucketSketch
+        db = self._db()
+        db.executescript(SCHEMA)
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def record(self, crop, irrigation, values):
+        """Fold {metric: value} into the cohort's and the fleet's sketches."""
+        db = self._db()
+        with db:
+            # Take the write lock first so concurrent read-modify-writes serialize
+            db.execute("BEGIN IMMEDIATE")
+            for cohort in (cohort_key(crop, irrigation), FLEET):
+                for metric, value in values.items():
+                    if metric not in SKETCH_SPECS or not _finite(value):
+                        continue
+                    row = db.execute(
+                        "SELECT counts FROM sketches WHERE cohort = ? AND metric = ?",
+                        (cohort, metric)
+                    ).fetchone()
+                    sketch = BucketSketch.from_bytes(metric, row[0]) if row else BucketSketch(metric)
+                    sketch.add(float(value))
+                    db.execute(
+                        "INSERT OR REPLACE INTO sketches (cohort, metric, total, counts) "
+                        "VALUES (?, ?, ?, ?)", (cohort, metric, sketch.total, sketch.to_bytes())
+                    )
+
+    def sketch(self, cohort, metric):
+        """Current sketch of a cohort (FLEET for all fields), or None."""
+        key = (cohort, metric)
+        cached = self._cache.get(key)
+        row = self._db().execute(
+            "SELECT total FROM sketches WHERE cohort = ? AND metric = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        if cached is None or cached.total != row[0]:
+            blob = self._db().execute(
+                "SELECT counts FROM sketches WHERE cohort = ? AND metric = ?", key
+            ).fetchone()[0]
+            cached = BucketSketch.from_bytes(metric, blob)
+            cached.cumulative()
+            self._cache[key] = cached
+        return cached
+
+    def rank(self, crop, irrigation, values):
+        """{metric: {"value", "cohort": {...}, "fleet": {...}}} for each metric.
+
+        Each ranking holds percentile (share of assessments below the
+        value), count and quartiles of the group.
+        """
+        result = {}
+        for metric, value in values.items():
+            if metric not in SKETCH_SPECS or not _finite(value):
+                continue
+            entry = {"value": value}
+            for name, cohort in (("cohort", cohort_key(crop, irrigation)), ("fleet", FLEET)):
+                sketch = self.sketch(cohort, metric)
+                if sketch is None:
+                    entry[name] = {"count": 0, "percentile": None}
+                    continue
+                entry[name] = {
+                    "count": sketch.total,
+                    "percentile": round(sketch.percentile(float(value)), 1),
+                    "quartiles": [round(sketch.quantile(q), 2) for q in QUARTILES],
+                }
+            result[metric] = entry
+        return result
+
+    def clear(self):
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM sketches")
+        self._cache.clear()
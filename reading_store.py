@@ -0,0 +1,283 @@
+import os
+import mmap
+import time
+import zlib
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes — single process only
+    fcntl = None
+
+# -------------------------------------------------
+# SHARED READING STORE (mmap ring buffers)
+# -------------------------------------------------
+# Every gunicorn worker maps the same file, so a device's POSTs and the
+# dashboard's polls see one set of readings no matter which worker they hit.
+#
+# File layout:
+#   header | slot 0 | slot 1 | ... | slot N-1
+#   slot   = slot header + running aggregates + ring of `capacity` records
+#
+# Slots form an open-addressing hash table keyed by device id. Slots are
+# never emptied, only taken over, so probe chains stay valid.
+#
+# Aggregates (sum, M2, min, max per sensor key) are updated once per insert
+# with Welford's method, so reading a session summary never touches the ring.
+# The ring only keeps the most recent `capacity` readings; a session accepts
+# up to `window` readings in total.
+
+SENSOR_KEYS = ("soil_ph", "soil_temp", "soil_moisture", "air_humidity")
+MAX_DEVICE_BYTES = 32                      # device ids are stored in the slot header
+
+MAGIC = b"VRS1"
+HEADER = struct.Struct("<4sII")            # magic, slots, capacity
+SLOT_HEADER = struct.Struct("<32sIId")     # device, session, count, updated_at
+AGGREGATES = struct.Struct("<16d")         # (sum, m2, min, max) per sensor key
+RECORD = struct.Struct("<5d")              # 4 sensor values + timestamp
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "vasuda_readings.bin")
+
+
+class InvalidDevice(ValueError):
+    """Device id that cannot be stored in a slot."""
+
+
+def check_device(device):
+    """Return `device`, or raise InvalidDevice if it does not fit a slot key."""
+    if len(device.encode("utf-8")) > MAX_DEVICE_BYTES:
+        raise InvalidDevice(f"device_id must be at most {MAX_DEVICE_BYTES} bytes (utf-8)")
+    return device
+
+
+class ReadingStore:
+    """Per-device, per-session reading buffers shared across processes."""
+
+    def __init__(self, path=DEFAULT_PATH, slots=1024, capacity=10, window=None):
+        self.path = path
+        self.slots = slots
+        self.capacity = capacity
+        self.window = window or capacity
+        self.slot_size = SLOT_HEADER.size + AGGREGATES.size + capacity * RECORD.size
+        self.size = HEADER.size + slots * self.slot_size
+        self._lock = threading.Lock()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._flock(exclusive=True)
+        try:
+            if not self._header_matches():
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, slots, capacity), 0)
+        finally:
+            self._funlock()
+        self._mm = mmap.mmap(self._fd, self.size)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reopen)
+
+    def _reopen(self):
+        # flock() locks belong to the open file description, which a forked
+        # child (gunicorn --preload) would otherwise share with its parent.
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR)
+
+    # ---------- locking ----------
+    def _flock(self, exclusive):
+        if fcntl:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def _funlock(self):
+        if fcntl:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _locked(self, exclusive=True):
+        with self._lock:
+            self._flock(exclusive)
+            try:
+                yield
+            finally:
+                self._funlock()
+
+    def _header_matches(self):
+        if os.fstat(self._fd).st_size != self.size:
+            return False
+        raw = os.pread(self._fd, HEADER.size, 0)
+        return raw == HEADER.pack(MAGIC, self.slots, self.capacity)
+
+    # ---------- slot table ----------
+    @staticmethod
+    def _key(device):
+        # Never truncate: two long ids sharing a prefix would share a slot
+        return check_device(device).encode("utf-8").ljust(MAX_DEVICE_BYTES, b"\0")
+
+    def _slot_offset(self, index):
+        return HEADER.size + index * self.slot_size
+
+    def _read_slot(self, index):
+        return SLOT_HEADER.unpack_from(self._mm, self._slot_offset(index))
+
+    def _write_slot(self, index, key, session, count):
+        SLOT_HEADER.pack_into(self._mm, self._slot_offset(index),
+                              key, session, count, time.time())
+
+    def _find(self, device, create=False):
+        """Probe for the device's slot. Returns the slot index or None."""
+        key = self._key(device)
+        start = zlib.crc32(key) % self.slots
+        oldest, oldest_ts = None, None
+        for step in range(self.slots):
+            index = (start + step) % self.slots
+            slot_key, _, _, updated = self._read_slot(index)
+            if slot_key == key:
+                return index
+            if slot_key == b"\0" * 32:
+                if create:
+                    self._write_slot(index, key, 0, 0)
+                    return index
+                return None
+            if oldest_ts is None or updated < oldest_ts:
+                oldest, oldest_ts = index, updated
+        if create:
+            # Table is full — take over the least recently used device
+            self._write_slot(oldest, key, 0, 0)
+            return oldest
+        return None
+
+    def _aggregates_offset(self, index):
+        return self._slot_offset(index) + SLOT_HEADER.size
+
+    def _record_offset(self, index, position):
+        return (self._aggregates_offset(index) + AGGREGATES.size
+                + (position % self.capacity) * RECORD.size)
+
+    @staticmethod
+    def _unpack_record(values):
+        reading = dict(zip(SENSOR_KEYS, values[:4]))
+        reading["timestamp"] = values[4]
+        return reading
+
+    # ---------- public API ----------
+    def start_session(self, device):
+        """Begin a new test for `device`, discarding its buffered readings."""
+        with self._locked():
+            index = self._find(device, create=True)
+            key, session, _, _ = self._read_slot(index)
+            session += 1
+            self._write_slot(index, key, session, 0)
+            return session
+
+    def append(self, device, reading):
+        """Store one reading. Returns False once the session is full."""
+        values = [float(reading[k]) for k in SENSOR_KEYS]
+        values.append(float(reading.get("timestamp") or time.time()))
+        with self._locked():
+            return self._append_locked(device, values)
+
+    def append_many(self, rows):
+        """Store (device, values) rows under a single lock acquisition.
+
+        `values` is (soil_ph, soil_temp, soil_moisture, air_humidity, timestamp).
+        Returns {device: number of rows accepted}.
+        """
+        accepted = {}
+        with self._locked():
+            for device, values in rows:
+                ok = self._append_locked(device, values)
+                accepted[device] = accepted.get(device, 0) + ok
+        return accepted
+
+    def _append_locked(self, device, values):
+        index = self._find(device, create=True)
+        key, session, count, _ = self._read_slot(index)
+        if count >= self.window:
+            return False
+        self._update_aggregates(index, count, values)
+        RECORD.pack_into(self._mm, self._record_offset(index, count), *values)
+        self._write_slot(index, key, session, count + 1)
+        return True
+
+    def _update_aggregates(self, index, count, values):
+        offset = self._aggregates_offset(index)
+        agg = list(AGGREGATES.unpack_from(self._mm, offset)) if count else [0.0] * 16
+        n = count + 1
+        for i, x in enumerate(values[:4]):
+            total, m2, lo, hi = agg[i * 4:i * 4 + 4]
+            old_mean = total / count if count else 0.0
+            total += x
+            m2 += (x - old_mean) * (x - total / n)
+            if count:
+                lo, hi = min(lo, x), max(hi, x)
+            else:
+                lo = hi = x
+            agg[i * 4:i * 4 + 4] = total, m2, lo, hi
+        AGGREGATES.pack_into(self._mm, offset, *agg)
+
+    def stats(self, device):
+        """Running aggregates of the current session — O(1), no ring scan.
+
+        Returns {"count": n, "<sensor key>": {"mean", "variance", "min", "max"}}.
+        Variance is the sample variance (0.0 for a single reading).
+        """
+        with self._locked(exclusive=False):
+            index = self._find(device)
+            if index is None:
+                return {"count": 0}
+            _, _, count, _ = self._read_slot(index)
+            if not count:
+                return {"count": 0}
+            agg = AGGREGATES.unpack_from(self._mm, self._aggregates_offset(index))
+        result = {"count": count}
+        for i, k in enumerate(SENSOR_KEYS):
+            total, m2, lo, hi = agg[i * 4:i * 4 + 4]
+            result[k] = {
+                "mean": total / count,
+                "variance": m2 / (count - 1) if count > 1 else 0.0,
+                "min": lo,
+                "max": hi
+            }
+        return result
+
+    def session(self, device):
+        """Current (session, count) for `device`."""
+        with self._locked(exclusive=False):
+            index = self._find(device)
+            if index is None:
+                return 0, 0
+            _, session, count, _ = self._read_slot(index)
+            return session, count
+
+    def readings(self, device):
+        """Readings of the device's current session, oldest first."""
+        with self._locked(exclusive=False):
+            index = self._find(device)
+            if index is None:
+                return []
+            _, _, count, _ = self._read_slot(index)
+            first = max(0, count - self.capacity)
+            return [
+                self._unpack_record(RECORD.unpack_from(
+                    self._mm, self._record_offset(index, pos)))
+                for pos in range(first, count)
+            ]
+
+    def devices(self):
+        """Number of occupied device slots."""
+        empty = b"\0" * 32
+        with self._locked(exclusive=False):
+            return sum(1 for i in range(self.slots) if self._read_slot(i)[0] != empty)
+
+    def latest(self, device):
+        """Most recent reading of the device's current session, or None."""
+        with self._locked(exclusive=False):
+            index = self._find(device)
+            if index is None:
+                return None
+            _, _, count, _ = self._read_slot(index)
+            if not count:
+                return None
+            return self._unpack_record(RECORD.unpack_from(
+                self._mm, self._record_offset(index, count - 1)))
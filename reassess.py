@@ -0,0 +1,332 @@
+import io
+import os
+import sys
+import csv
+import gzip
+import json
+import time
+import argparse
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from reading_store import SENSOR_KEYS
+from farm_state import SHRS_WINDOW, detect_risk_trend
+
+# -------------------------------------------------
+# OFFLINE BULK RE-ASSESSMENT
+# -------------------------------------------------
+# Streams an archived sensor log (CSV or NDJSON, optionally .gz) through
+# the same pipeline as the app — per-test averages → env/practice risk →
+# SHRS → trend → advice — without HTTP or the app's stores:
+#
+#     python reassess.py readings.ndjson.gz results.csv
+#     python reassess.py readings.csv results.jsonl --workers 8 --readings-per-test 10
+#
+# Input rows need device_id (or device) and the four sensor keys;
+# timestamp (epoch seconds or ISO 8601), session, farm_id, crop,
+# irrigation and fertilizer are optional. Rows are assumed to be in time
+# order per device, one row per line.
+#
+# A test is READINGS_PER_TEST consecutive readings of one device (and
+# session); a gap longer than --gap seconds abandons an unfinished test.
+# Parsing and scoring run on a process pool with a bounded number of
+# blocks in flight, so memory stays flat however large the log is. The
+# parent only groups readings and tracks each farm's SHRS window for the
+# trend, in input order.
+#
+# Output is CSV unless the name ends in .jsonl / .ndjson (one JSON object
+# per test) or .parquet (needs pyarrow: pip install pyarrow).
+
+OUTPUT_COLUMNS = (
+    "device_id", "farm_id", "session", "start", "end", "readings",
+    "avg_ph", "avg_temp", "avg_moisture", "avg_humidity",
+    "crop", "irrigation", "fertilizer",
+    "env_risk", "practice_risk", "shrs", "trend", "advice",
+)
+NUMERIC_COLUMNS = {"start", "end", "avg_ph", "avg_temp", "avg_moisture", "avg_humidity"}
+INTEGER_COLUMNS = {"readings", "env_risk", "practice_risk", "shrs"}
+
+
+# -------------------------------------------------
+# INPUT (runs in worker processes)
+# -------------------------------------------------
+def _open(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def _timestamp(value):
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def _normalize(row):
+    """Input row dict → (device, session, ts, (4 sensor values), farm, crop, irr, fert)."""
+    device = row.get("device_id") or row.get("device")
+    if not device:
+        raise ValueError("missing device_id")
+    return (
+        str(device),
+        str(row.get("session") or ""),
+        _timestamp(row.get("timestamp")),
+        tuple(float(row[k]) for k in SENSOR_KEYS),
+        str(row.get("farm_id") or device),
+        row.get("crop") or "",
+        row.get("irrigation") or "",
+        row.get("fertilizer") or "",
+    )
+
+
+def parse_block(fmt, header, lines):
+    """Raw lines → (normalized rows, rejected line count)."""
+    rows, rejected = [], 0
+    if fmt == "csv":
+        lines = csv.reader(lines)
+    for line in lines:
+        if not (line if fmt == "csv" else line.strip()):
+            continue
+        try:
+            record = dict(zip(header, line)) if fmt == "csv" else json.loads(line)
+            rows.append(_normalize(record))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            rejected += 1
+    return rows, rejected
+
+
+def iter_blocks(path, fmt, block_lines):
+    """(header, lines) blocks of the input file, read lazily."""
+    with _open(path) as f:
+        header = next(csv.reader([f.readline()])) if fmt == "csv" else None
+        block = []
+        for line in f:
+            block.append(line)
+            if len(block) >= block_lines:
+                yield header, block
+                block = []
+        if block:
+            yield header, block
+
+
+# -------------------------------------------------
+# SCORING (runs in worker processes)
+# -------------------------------------------------
+def score_tests(rows):
+    """(4 averages + 3 practices) rows → env risk, practice risk, SHRS, advice ids."""
+    from batch_scoring import score_batch, decode_advice
+
+    scores = score_batch(*zip(*rows))
+    return (scores["env_risk"].tolist(), scores["practice_risk"].tolist(),
+            scores["shrs"].tolist(), decode_advice(scores["advice"]))
+
+
+# -------------------------------------------------
+# GROUPING (parent process)
+# -------------------------------------------------
+class TestGrouper:
+    """Turns a per-device reading stream into completed tests."""
+
+    def __init__(self, readings_per_test, gap):
+        self.readings_per_test = readings_per_test
+        self.gap = gap
+        self.open = {}             # (device, session) -> test in progress
+        self.abandoned = 0
+
+    def add(self, row):
+        """Returns the completed test, or None."""
+        device, session, ts, values, farm, crop, irrigation, fertilizer = row
+        key = (device, session)
+        test = self.open.get(key)
+        if test is not None and self.gap and ts is not None and test["end"] is not None \
+                and ts - test["end"] > self.gap:
+            self.abandoned += 1
+            test = None
+        if test is None:
+            test = self.open[key] = {
+                "device_id": device, "session": session, "start": ts, "end": ts,
+                "sums": [0.0] * len(SENSOR_KEYS), "readings": 0,
+            }
+        test["end"] = ts if ts is not None else test["end"]
+        test["readings"] += 1
+        test["sums"] = [s + v for s, v in zip(test["sums"], values)]
+        if test["readings"] < self.readings_per_test:
+            return None
+
+        del self.open[key]
+        # Same rounding as build_summary()
+        test["averages"] = tuple(round(s / test["readings"], 2) for s in test.pop("sums"))
+        test["farm_id"] = farm
+        test["practices"] = (crop, irrigation, fertilizer)
+        return test
+
+
+# -------------------------------------------------
+# OUTPUT
+# -------------------------------------------------
+class CsvWriter:
+    def __init__(self, path):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(OUTPUT_COLUMNS)
+
+    def write(self, columns):
+        columns = dict(columns, advice=[";".join(a) for a in columns["advice"]])
+        self._writer.writerows(zip(*(columns[c] for c in OUTPUT_COLUMNS)))
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, columns):
+        for values in zip(*(columns[c] for c in OUTPUT_COLUMNS)):
+            self._file.write(json.dumps(dict(zip(OUTPUT_COLUMNS, values)), ensure_ascii=False))
+            self._file.write("\n")
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """One row group per chunk of tests."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("Parquet output needs pyarrow (pip install pyarrow); "
+                     "use a .csv or .jsonl output instead")
+        self._pa = pa
+        types = {c: pa.float64() for c in NUMERIC_COLUMNS}
+        types.update({c: pa.int16() for c in INTEGER_COLUMNS})
+        types["advice"] = pa.list_(pa.string())
+        self._schema = pa.schema([(c, types.get(c, pa.string())) for c in OUTPUT_COLUMNS])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, columns):
+        self._writer.write_table(self._pa.table(
+            {c: columns[c] for c in OUTPUT_COLUMNS}, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_writer(path):
+    if path.endswith(".parquet"):
+        return ParquetWriter(path)
+    if path.endswith((".jsonl", ".ndjson")):
+        return JsonlWriter(path)
+    return CsvWriter(path)
+
+
+# -------------------------------------------------
+# PIPELINE
+# -------------------------------------------------
+def reassess(source, output, fmt=None, workers=None, readings_per_test=10, gap=1800,
+             block_lines=20000, tests_per_chunk=5000):
+    """Stream `source` through the pipeline into `output`. Returns counters."""
+    fmt = fmt or ("csv" if ".csv" in os.path.basename(source) else "ndjson")
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    grouper = TestGrouper(readings_per_test, gap)
+    history = {}                   # farm id -> last SHRS_WINDOW SHRS values
+    writer = open_writer(output)
+    counts = {"rows": 0, "rejected": 0, "tests": 0}
+
+    def emit(tests, scores):
+        env_risk, practice_risk, shrs, advice = scores
+        trends = []
+        for test, value in zip(tests, shrs):
+            window = history.setdefault(test["farm_id"], deque(maxlen=SHRS_WINDOW))
+            window.append(value)
+            trends.append(detect_risk_trend(list(window)))
+        columns = {c: [t.get(c) for t in tests] for c in
+                   ("device_id", "farm_id", "session", "start", "end", "readings")}
+        for i, key in enumerate(("avg_ph", "avg_temp", "avg_moisture", "avg_humidity")):
+            columns[key] = [t["averages"][i] for t in tests]
+        for i, key in enumerate(("crop", "irrigation", "fertilizer")):
+            columns[key] = [t["practices"][i] for t in tests]
+        columns.update(env_risk=env_risk, practice_risk=practice_risk, shrs=shrs,
+                       trend=trends, advice=advice)
+        writer.write(columns)
+        counts["tests"] += len(tests)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parsing, scoring, pending = deque(), deque(), []
+
+        def drain_scoring(limit):
+            while len(scoring) > limit:
+                tests, future = scoring.popleft()
+                emit(tests, future.result())
+
+        def submit_scoring(force=False):
+            nonlocal pending
+            if pending and (force or len(pending) >= tests_per_chunk):
+                rows = [t["averages"] + t["practices"] for t in pending]
+                scoring.append((pending, pool.submit(score_tests, rows)))
+                pending = []
+                drain_scoring(max_in_flight)
+
+        def drain_parsing(limit):
+            while len(parsing) > limit:
+                rows, rejected = parsing.popleft().result()
+                counts["rows"] += len(rows)
+                counts["rejected"] += rejected
+                for row in rows:
+                    test = grouper.add(row)
+                    if test is not None:
+                        pending.append(test)
+                submit_scoring()
+
+        for header, lines in iter_blocks(source, fmt, block_lines):
+            parsing.append(pool.submit(parse_block, fmt, header, lines))
+            drain_parsing(max_in_flight)
+        drain_parsing(0)
+        submit_scoring(force=True)
+        drain_scoring(0)
+
+    writer.close()
+    counts["abandoned"] = grouper.abandoned
+    counts["unfinished"] = len(grouper.open)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-assess archived sensor logs in bulk")
+    parser.add_argument("source", help="CSV or NDJSON file (.gz ok), or - for stdin")
+    parser.add_argument("output", help=".csv (default), .jsonl / .ndjson, or .parquet (needs pyarrow)")
+    parser.add_argument("--format", choices=("csv", "ndjson"),
+                        help="input format (default: from the file name)")
+    parser.add_argument("--workers", type=int, help="processes (default: CPU count)")
+    parser.add_argument("--readings-per-test", type=int,
+                        default=int(os.getenv("READINGS_PER_TEST", 10)))
+    parser.add_argument("--gap", type=float, default=1800,
+                        help="seconds without readings that abandon a test (0 = never)")
+    parser.add_argument("--block-lines", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    counts = reassess(args.source, args.output, fmt=args.format, workers=args.workers,
+                      readings_per_test=args.readings_per_test, gap=args.gap,
+                      block_lines=args.block_lines)
+    elapsed = time.perf_counter() - started
+    print(f"{counts['rows']} readings → {counts['tests']} tests in {elapsed:.1f} s "
+          f"({counts['rows'] / elapsed if elapsed else 0:,.0f} readings/s); "
+          f"{counts['rejected']} rejected, {counts['abandoned']} abandoned, "
+          f"{counts['unfinished']} unfinished; wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import logging
+
+# -------------------------------------------------
+# STARTUP PROFILE (STARTUP_PROFILE=1)
+# -------------------------------------------------
+# app.py calls mark() after each component is imported or built; with the
+# profile enabled, each mark records the wall time and resident memory
+# added since the previous one, and report() logs the table once the app
+# is ready. Disabled, mark() is a no-op.
+#
+#     STARTUP_PROFILE=1 python -c "import app"
+#
+# For a per-module breakdown of a slow step, use python -X importtime.
+
+
+def rss_bytes():
+    """Current resident set size, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class StartupProfile:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.steps = []            # (name, seconds, rss growth in bytes or None)
+        self.started = self._last = time.perf_counter()
+        self._rss = rss_bytes() if enabled else None
+
+    def mark(self, name):
+        if not self.enabled:
+            return
+        now, rss = time.perf_counter(), rss_bytes()
+        growth = rss - self._rss if rss is not None and self._rss is not None else None
+        self.steps.append((name, now - self._last, growth))
+        self._last, self._rss = now, rss
+
+    def report(self, title="Startup profile"):
+        if not self.enabled:
+            return
+        lines = [f"{title} (pid {os.getpid()}, {len(sys.modules)} modules loaded):"]
+        for name, seconds, growth in self.steps:
+            memory = f"{growth / 2**20:+8.1f} MB" if growth is not None else "       -"
+            lines.append(f"  {name:<28}{seconds * 1000:9.1f} ms {memory}")
+        lines.append(f"  {'total':<28}{(self._last - self.started) * 1000:9.1f} ms")
+        logging.warning("\n".join(lines))
+
+
+profile = StartupProfile(os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes"))
@@ -37,6 +37,9 @@ document.addEventListener("DOMContentLoaded", () => {
   const langSelect = document.getElementById("langSelect");
   const translateBtn = document.getElementById("translateBtn");
   let currentRecommendation = "";
+  // Structured report of a deterministic result — lets /translate use
+  // the pre-translated catalog instead of the LLM.
+  let currentReport = null;
 
   translateBtn.onclick = async () => {
     if (!currentRecommendation) return;
@@ -61,7 +64,8 @@ document.addEventListener("DOMContentLoaded", () => {
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           text: plainText,
-          language: targetLang
+          language: targetLang,
+          report: currentReport
         })
       });
       const data = await response.json();
@@ -87,18 +91,20 @@ document.addEventListener("DOMContentLoaded", () => {
     sensorModal.classList.remove("hidden");
     progressBar.style.width = "0%";
     sensorText.innerText = "0 / 10";
+    clearInterval(intervalId);
 
     await fetch("/start-test", { method: "POST" });
 
-    intervalId = setInterval(async () => {
-      const summary = await fetch("/summary").then(r => r.json());
+    // Progress is pushed over /summary/stream; fall back to polling
+    // /summary where EventSource is unavailable or the stream drops.
+    const showProgress = (summary) => {
       const count = summary.count || 0;
+      const target = summary.target || 10;
 
-      progressBar.style.width = (count * 10) + "%";
-      sensorText.innerText = `${count} / 10`;
+      progressBar.style.width = Math.round(count / target * 100) + "%";
+      sensorText.innerText = `${count} / ${target}`;
 
-      if (count === 10) {
-        clearInterval(intervalId);
+      if (count >= target) {
         sensorModal.classList.add("hidden");
         farmerModal.classList.remove("hidden");
 
@@ -108,8 +114,37 @@ document.addEventListener("DOMContentLoaded", () => {
         tempEl.innerText = summary.avg_temp;
         moistureEl.innerText = summary.avg_moisture;
         humidityEl.innerText = summary.avg_humidity;
+        return true;
       }
-    }, 3000);
+      return false;
+    };
+
+    const startPolling = () => {
+      intervalId = setInterval(async () => {
+        const summary = await fetch("/summary").then(r => r.json());
+        if (showProgress(summary)) clearInterval(intervalId);
+      }, 3000);
+    };
+
+    if (!window.EventSource) {
+      startPolling();
+      return;
+    }
+
+    const stream = new EventSource("/summary/stream");
+    stream.addEventListener("progress", (e) => showProgress(JSON.parse(e.data)));
+    stream.addEventListener("complete", (e) => {
+      stream.close();
+      showProgress(JSON.parse(e.data));
+    });
+    stream.addEventListener("timeout", () => {
+      stream.close();
+      startPolling();
+    });
+    stream.onerror = () => {
+      stream.close();
+      startPolling();
+    };
   };
 
   // ---------- COMPUTE RISK + AI ----------
@@ -160,7 +195,8 @@ document.addEventListener("DOMContentLoaded", () => {
           crop,
           irrigation,
           fertilizer,
-          risk_score: finalRisk
+          risk_score: finalRisk,
+          async: true
         })
       });
 
@@ -169,6 +205,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
       if (data.recommendation) {
         currentRecommendation = data.recommendation;
+        currentReport = data.source === "deterministic" ? data.report : null;
         // Parse markdown text using marked library added to base.html
         const formattedText = marked.parse(currentRecommendation);
         aiAdviceEl.innerHTML = formattedText;
@@ -180,6 +217,10 @@ document.addEventListener("DOMContentLoaded", () => {
             translateBtn.disabled = false;
         }
 
+        // The deterministic report is shown right away; swap in the
+        // Gemini-polished version when its job finishes.
+        if (data.job_id) pollPolish(data.job_id);
+
         // Update Sustainable Index (100 - SHRS)
         if (data.shrs !== undefined) {
           riskEl.innerText = 100 - data.shrs;
@@ -228,6 +269,35 @@ document.addEventListener("DOMContentLoaded", () => {
     loadHistory();
   };
 
+  // ---------- GEMINI POLISH (async job) ----------
+  let activeJob = null;
+
+  async function pollPolish(jobId, attempt = 0) {
+    activeJob = jobId;
+    if (attempt >= 20) return;
+    await new Promise(r => setTimeout(r, 1500));
+    if (activeJob !== jobId) return;  // a newer report replaced this one
+
+    try {
+      const res = await fetch(`/ai-recommendation/jobs/${jobId}`);
+      const job = await res.json();
+      if (activeJob !== jobId) return;
+
+      if (job.status === "done") {
+        currentRecommendation = job.recommendation;
+        currentReport = null;
+        const formattedText = marked.parse(currentRecommendation);
+        aiAdviceEl.innerHTML = formattedText;
+        aiModalContent.innerHTML = formattedText;
+        loadHistory();
+      } else if (job.status === "pending" || job.status === "unknown") {
+        pollPolish(jobId, attempt + 1);
+      }
+    } catch (e) {
+      console.error("Polish poll failed:", e);
+    }
+  }
+
   // ========== SIDEBAR LOGIC ==========
   const sidebar = document.getElementById("historySidebar");
   const sidebarToggle = document.getElementById("sidebarToggle");
@@ -256,7 +326,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
   async function loadHistory() {
     try {
-      const res = await fetch("/history");
+      const res = await fetch("/history?view=compact&fields=id,shrs,trend,timestamp,sensor.ph,sensor.temp,sensor.moisture,practices.crop");
       const records = await res.json();
 
       if (!records.length) {
@@ -298,10 +368,10 @@ document.addEventListener("DOMContentLoaded", () => {
 
   // Make loadRecord globally accessible
   window.loadRecord = function(id) {
-    fetch("/history")
-      .then(r => r.json())
-      .then(records => {
-        const record = records.find(r => r.id === id);
+    activeJob = null;
+    fetch(`/history/${id}`)
+      .then(r => r.ok ? r.json() : null)
+      .then(record => {
         if (!record) return;
 
         // Highlight active item
@@ -322,6 +392,7 @@ document.addEventListener("DOMContentLoaded", () => {
         // Populate AI advice
         if (record.recommendation) {
           currentRecommendation = record.recommendation;
+          currentReport = null;
           const formattedText = marked.parse(currentRecommendation);
           aiAdviceEl.innerHTML = formattedText;
           aiModalContent.innerHTML = formattedText;
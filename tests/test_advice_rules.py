@@ -0,0 +1,194 @@
+import itertools
+
+import pytest
+
+from advice_rules import (TEMPLATES, advice_rule_hits, compute_env_risk,
+                          compute_practice_risk, generate_structured_advice, render_advice)
+from batch_scoring import decode_advice, score_batch
+
+
+# -------------------------------------------------
+# REFERENCE: the hand-written scalar rules the table replaced
+# -------------------------------------------------
+def reference_env_risk(avg_ph, avg_temp, avg_moisture, avg_humidity):
+    env_risk = 0
+    if avg_ph < 5.5 or avg_ph > 7.5:
+        env_risk += 25
+    if avg_moisture < 30:
+        env_risk += 25
+    elif avg_moisture < 40:
+        env_risk += 10
+    if avg_temp > 40:
+        env_risk += 25
+    elif avg_temp > 35:
+        env_risk += 10
+    if avg_humidity < 35:
+        env_risk += 25
+    elif avg_humidity < 50:
+        env_risk += 10
+    return env_risk
+
+
+def reference_practice_risk(crop, irrigation, fertilizer):
+    risk = 0
+    if irrigation and irrigation.lower() == "daily":
+        risk += 10
+    if fertilizer and fertilizer.lower() == "weekly":
+        risk += 10
+    if crop and crop.lower() == "rice":
+        risk += 5
+    return risk
+
+
+def reference_advice(avg_ph, avg_temp, avg_moisture, avg_humidity, crop, irrigation, fertilizer):
+    advice = []
+    if avg_ph < 5.5:
+        advice.append(
+            f"⚠️ **Acidic Soil (pH {avg_ph})**: Apply agricultural lime "
+            f"(calcium carbonate) at 2–4 tonnes/hectare to raise pH. "
+            f"Retest after 4–6 weeks. Avoid ammonium-based fertilizers "
+            f"which further acidify soil.")
+    elif avg_ph > 7.5:
+        advice.append(
+            f"⚠️ **Alkaline Soil (pH {avg_ph})**: Apply elemental sulfur "
+            f"or gypsum at 1–2 tonnes/hectare. Incorporate organic matter "
+            f"(composted manure, peat) to gradually lower pH. Avoid "
+            f"over-liming.")
+    else:
+        advice.append(
+            f"✅ **Soil pH ({avg_ph})** is within the optimal range "
+            f"(5.5–7.5). Maintain current practices.")
+
+    if avg_moisture < 30 and (not irrigation or irrigation.lower() != "daily"):
+        advice.append(
+            f"⚠️ **Low Moisture ({avg_moisture}%)**: Increase irrigation "
+            f"frequency. Consider drip irrigation for water efficiency. "
+            f"Apply organic mulch (4–6 cm) to reduce evaporation.")
+    elif avg_moisture < 30 and irrigation and irrigation.lower() == "daily":
+        advice.append(
+            f"⚠️ **Low Moisture Despite Daily Irrigation ({avg_moisture}%)**: "
+            f"Soil may have poor water retention. Add compost or "
+            f"coco peat to improve structure. Check for drainage issues.")
+    elif avg_moisture > 50 and irrigation and irrigation.lower() == "daily":
+        advice.append(
+            f"⚠️ **Over-Irrigation Detected (Moisture {avg_moisture}%, "
+            f"Daily Irrigation)**: Reduce watering frequency to every "
+            f"2–3 days. Over-watering leaches nutrients and promotes "
+            f"root rot. Switch to scheduled drip irrigation.")
+    else:
+        advice.append(
+            f"✅ **Soil Moisture ({avg_moisture}%)** is adequate. "
+            f"Continue current irrigation schedule.")
+
+    if avg_temp > 40:
+        advice.append(
+            f"🔥 **Extreme Heat ({avg_temp}°C)**: Apply straw mulch "
+            f"(8–10 cm) immediately. Irrigate during early morning "
+            f"or late evening. Consider shade netting for sensitive crops.")
+    elif avg_temp > 35:
+        advice.append(
+            f"⚠️ **High Temperature ({avg_temp}°C)**: Monitor crop stress "
+            f"closely. Increase organic mulch cover. Avoid fertilizer "
+            f"application during peak heat to prevent root burn.")
+    elif avg_temp < 10:
+        advice.append(
+            f"❄️ **Low Temperature ({avg_temp}°C)**: Risk of frost damage. "
+            f"Use row covers or cold frames. Delay planting of warm-season "
+            f"crops until soil warms above 15°C.")
+
+    if avg_humidity < 35:
+        advice.append(
+            f"⚠️ **Low Humidity ({avg_humidity}%)**: Increase mulching to "
+            f"preserve soil moisture. Consider windbreaks to reduce "
+            f"evapotranspiration. Mist irrigation may help in greenhouse "
+            f"settings.")
+    elif avg_humidity > 70 and avg_temp > 28:
+        advice.append(
+            f"🦠 **Fungal Disease Risk (Humidity {avg_humidity}%, "
+            f"Temp {avg_temp}°C)**: Monitor for blight, mildew, and "
+            f"rust. Ensure adequate plant spacing for airflow. "
+            f"Apply preventive copper-based fungicide if symptoms appear.")
+
+    if fertilizer and fertilizer.lower() == "weekly":
+        advice.append(
+            f"⚠️ **Frequent Fertilization (Weekly)**: Risk of nutrient "
+            f"buildup and salt stress. Adopt split nitrogen application — "
+            f"apply 40% at planting, 30% at tillering, 30% at flowering. "
+            f"Conduct soil nutrient tests every 3 months.")
+    elif fertilizer and fertilizer.lower() == "none":
+        advice.append(
+            f"⚠️ **No Fertilizer Applied**: Soil nutrient depletion is "
+            f"likely over time. Consider a balanced NPK application or "
+            f"composted organic manure as a minimum baseline.")
+
+    if crop and crop.lower() == "rice":
+        advice.append(
+            f"🌾 **Rice Cultivation**: Maintain standing water depth of "
+            f"2–5 cm during vegetative stage. Alternate wetting and drying "
+            f"(AWD) technique saves 15–30% water with no yield loss.")
+    return advice
+
+
+# -------------------------------------------------
+# INPUTS: every threshold, just below and just above
+# -------------------------------------------------
+def around(*thresholds):
+    return sorted({v for t in thresholds for v in (t - 0.01, t, t + 0.01)} | {thresholds[0] - 5})
+
+
+PH = around(5.5, 7.5) + [6.5]
+TEMP = around(10, 28, 35, 40) + [28.0, 35]
+MOISTURE = around(30, 40, 50)
+HUMIDITY = around(35, 50, 70)
+PRACTICES = list(itertools.product(
+    ["Rice", "rice", "wheat", "", None],
+    ["daily", "DAILY", "weekly", "", None],
+    ["weekly", "Weekly", "none", "monthly", None],
+))
+SENSORS = list(itertools.product(PH, TEMP, MOISTURE, HUMIDITY))
+# Each sensor combination with one practice combination, cycling through all of them
+CASES = [(*sensors, *PRACTICES[i % len(PRACTICES)]) for i, sensors in enumerate(SENSORS)]
+
+
+def test_scalar_rules_match_reference():
+    for case in CASES:
+        assert compute_env_risk(*case[:4]) == reference_env_risk(*case[:4]), case
+        assert compute_practice_risk(*case[4:]) == reference_practice_risk(*case[4:]), case
+        assert generate_structured_advice(*case) == reference_advice(*case), case
+
+
+def test_rule_hits_render_the_same_advice():
+    for case in CASES[::7]:
+        values = dict(zip(("avg_ph", "avg_temp", "avg_moisture", "avg_humidity"), case))
+        rendered = [render_advice(TEMPLATES[rule_id], values) for rule_id in advice_rule_hits(*case)]
+        assert rendered == reference_advice(*case), case
+
+
+def test_batch_matches_reference():
+    scores = score_batch(*zip(*CASES))
+    hits = decode_advice(scores["advice"])
+    for i, case in enumerate(CASES):
+        env, practice = reference_env_risk(*case[:4]), reference_practice_risk(*case[4:])
+        assert scores["env_risk"][i] == env, case
+        assert scores["practice_risk"][i] == practice, case
+        assert scores["shrs"][i] == min(env + practice, 100), case
+        assert hits[i] == advice_rule_hits(*case), case
+
+
+def test_batch_practice_columns_are_optional():
+    scores = score_batch([5.0, 8.0], [41, 20], [20, 60], [30, 80])
+    assert scores["practice_risk"].tolist() == [0, 0]
+    assert scores["env_risk"].tolist() == [
+        reference_env_risk(5.0, 41, 20, 30), reference_env_risk(8.0, 20, 60, 80)]
+
+
+@pytest.mark.parametrize("avg_ph, error", [
+    ([5, None], r"avg_ph\[1\]"),
+    ([5, float("nan")], r"avg_ph\[1\]"),
+    ([float("inf"), 6], r"avg_ph\[0\]"),
+    ([5, "acidic"], r"avg_ph\[1\]"),
+    ([5], "avg_ph"),
+])
+def test_batch_rejects_bad_sensor_values(avg_ph, error):
+    with pytest.raises(ValueError, match=error):
+        score_batch(avg_ph, [20, 20], [40, 40], [60, 60])
@@ -0,0 +1,109 @@
+import pytest
+
+from history_store import HistoryStore, timestamp_text
+
+REPORT = (
+    "## Soil Health Risk Score: {shrs}/100\n\n"
+    "**Environmental Risk:** 30 | **Practice Risk:** 20\n\n"
+    "### Recommendations\n\n"
+    "- Soil is acidic (pH {ph}). Apply agricultural lime: 2-4 tons/hectare. "
+    "Re-test after 3 months!\n\n"
+    "- Moisture is adequate? Keep the current schedule: weekly.\n\n"
+)
+
+
+def make_record(i, farm_id="farm-1", recommendation=None):
+    ph = round(4.5 + (i % 7) * 0.5, 2)
+    shrs = (i * 7) % 101
+    return {
+        "created": 1700000000.0 + i * 3600,
+        "sensor": {"ph": ph, "temp": 20.5 + i % 5, "moisture": 40.0, "humidity": 61.25},
+        "practices": {"crop": ["Rice", "wheat", "Maize"][i % 3],
+                      "irrigation": ["daily", "weekly"][i % 2],
+                      "fertilizer": None if i % 4 == 0 else "monthly"},
+        "shrs": shrs,
+        "env_risk": 30,
+        "practice_risk": 20,
+        "trend": ["Stable", "Increasing Risk", "Insufficient Data"][i % 3],
+        "recommendation": recommendation if recommendation is not None
+        else REPORT.format(shrs=shrs, ph=ph),
+        "farm_id": farm_id,
+    }
+
+
+def expected(record, record_id):
+    result = {k: v for k, v in record.items() if k != "created"}
+    result["id"] = record_id
+    result["timestamp"] = timestamp_text(record["created"])
+    return result
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.db"))
+
+
+def table_count(store, table):
+    return store._db().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_round_trip_is_identical(store):
+    records = [make_record(i) for i in range(40)]
+    records.append(make_record(40, recommendation="Unicode: pH बढ़ाएँ. Ends without newline"))
+    records.append(make_record(41, recommendation=""))
+    ids = [store.add(r) for r in records[:10]]
+    store.add_many(records[10:])
+    ids += list(range(ids[-1] + 1, ids[-1] + 1 + len(records) - 10))
+
+    for record, record_id in zip(records, ids):
+        assert store.get(record_id) == expected(record, record_id)
+
+    page, cursor = store.page(limit=len(records))
+    assert cursor == ids[0]
+    assert page == [expected(r, i) for r, i in reversed(list(zip(records, ids)))]
+
+
+def test_repeated_sentences_are_stored_once(store):
+    store.add_many([make_record(i) for i in range(50)])
+    fragments = table_count(store, "fragments")
+    store.add_many([make_record(i) for i in range(50)])
+    assert table_count(store, "fragments") == fragments
+
+
+def test_update_recommendation_stores_text_whole(store):
+    record_id = store.add(make_record(1))
+    fragments = table_count(store, "fragments")
+    text = "Polished advice. Every sentence is new.\n\nAnd so is this one!"
+    store.update_recommendation(record_id, text)
+    assert store.get(record_id)["recommendation"] == text
+    assert table_count(store, "fragments") == fragments
+
+
+def test_clear_drops_labels_and_fragments(store):
+    store.add_many([make_record(i) for i in range(10)])
+    store.clear()
+    assert store.count() == 0
+    assert table_count(store, "fragments") == 0
+    assert table_count(store, "labels") == 0
+
+    record = make_record(3)
+    record_id = store.add(record)
+    assert store.get(record_id) == expected(record, record_id)
+
+
+def test_clear_in_another_worker(tmp_path):
+    # Two workers on one database; `other` has label and fragment ids cached
+    path = str(tmp_path / "history.db")
+    worker, other = HistoryStore(path), HistoryStore(path)
+    other.add_many([make_record(i) for i in range(6)])
+    worker.clear()
+
+    records = [make_record(i) for i in range(6, 12)]
+    ids = [worker.add(records[0]), other.add(records[1])]
+    other.add_many(records[2:])
+    ids += list(range(ids[-1] + 1, ids[-1] + 5))
+
+    for store in (worker, other):
+        page, _ = store.page(limit=len(records))
+        assert page == [expected(r, i) for r, i in reversed(list(zip(records, ids)))]
+    assert other.count() == worker.count() == len(records)
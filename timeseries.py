@@ -0,0 +1,208 @@
+import math
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# -------------------------------------------------
+# PER-FARM TIME-SERIES ROLLUPS
+# -------------------------------------------------
+# Each assessment is folded into hourly, daily and seasonal buckets
+# (count, sum, sum of squares, min, max) per farm and metric. Trend
+# queries read only these buckets through the primary key, so their cost
+# depends on the window length, not on how much history exists.
+#
+# Seasons are meteorological (Dec–Feb, Mar–May, Jun–Aug, Sep–Nov, UTC);
+# a seasonal bucket starts on the first day of its season.
+
+METRICS = ("shrs", "avg_ph", "avg_temp", "avg_moisture", "avg_humidity")
+GRANULARITIES = ("hour", "day", "season")
+BUCKET_SECONDS = {"hour": 3600, "day": 86400}
+DAY = 86400
+
+# Slope (units per day) below which a series counts as flat
+STABLE_SLOPE = 0.05
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    farm_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    sumsq REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (farm_id, metric, granularity, bucket)
+) WITHOUT ROWID;
+"""
+
+UPSERT = """
+INSERT INTO rollups (farm_id, metric, granularity, bucket, count, sum, sumsq, min, max)
+VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)
+ON CONFLICT (farm_id, metric, granularity, bucket) DO UPDATE SET
+    count = count + 1,
+    sum = sum + excluded.sum,
+    sumsq = sumsq + excluded.sumsq,
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max)
+"""
+
+
+def season_start(ts):
+    """Epoch of the first day of the meteorological season containing ts."""
+    d = datetime.fromtimestamp(ts, timezone.utc)
+    month = (d.month // 3) * 3 or 12     # Dec/Jan/Feb → Dec, Mar–May → Mar, ...
+    year = d.year - 1 if d.month < 3 else d.year
+    return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+
+
+def bucket_start(ts, granularity):
+    if granularity == "season":
+        return season_start(ts)
+    size = BUCKET_SECONDS[granularity]
+    return int(ts // size * size)
+
+
+def _summarize(rows):
+    """Merge (count, sum, sumsq, min, max) rows into window statistics."""
+    count = sum(r[0] for r in rows)
+    if not count:
+        return {"count": 0}
+    total = sum(r[1] for r in rows)
+    mean = total / count
+    variance = max(sum(r[2] for r in rows) / count - mean * mean, 0.0)
+    return {
+        "count": count,
+        "mean": mean,
+        "std": math.sqrt(variance),
+        "min": min(r[3] for r in rows),
+        "max": max(r[4] for r in rows),
+    }
+
+
+def _slope_per_day(points):
+    """Least-squares slope of (epoch, value) points, in units per day."""
+    if len(points) < 2:
+        return None
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    if not var_t:
+        return None
+    cov = sum((t - mean_t) * (v - mean_v) for t, v in points)
+    return cov / var_t * DAY
+
+
+class TimeSeriesStore:
+    """Rollup buckets in SQLite; one connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        db = self._db()
+        db.executescript(SCHEMA)
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def record(self, farm_id, values, ts=None):
+        """Fold {metric: value} observed at ts into every granularity."""
+        ts = time.time() if ts is None else ts
+        rows = [
+            (farm_id, metric, granularity, bucket_start(ts, granularity),
+             float(value), float(value) ** 2, float(value), float(value))
+            for metric, value in values.items() if metric in METRICS and value is not None
+            for granularity in GRANULARITIES
+        ]
+        db = self._db()
+        with db:
+            db.executemany(UPSERT, rows)
+
+    def buckets(self, farm_id, metric, granularity, since):
+        """(bucket, count, sum, sumsq, min, max) rows from `since`, oldest first."""
+        return self._db().execute(
+            "SELECT bucket, count, sum, sumsq, min, max FROM rollups "
+            "WHERE farm_id = ? AND metric = ? AND granularity = ? AND bucket >= ? "
+            "ORDER BY bucket", (farm_id, metric, granularity, since)
+        ).fetchall()
+
+    def trend(self, farm_id, metric="shrs", granularity="day", window=30, now=None):
+        """Slope, window statistics and year-over-year seasonal change.
+
+        `window` counts buckets of `granularity` back from the current one.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        now = time.time() if now is None else now
+
+        current = bucket_start(now, granularity)
+        if granularity == "season":
+            since = current
+            for _ in range(window - 1):
+                since = season_start(since - DAY)
+        else:
+            since = current - (window - 1) * BUCKET_SECONDS[granularity]
+
+        rows = self.buckets(farm_id, metric, granularity, since)
+        series = [
+            {"start": b, "count": c, "mean": s / c, "min": lo, "max": hi}
+            for b, c, s, _, lo, hi in rows
+        ]
+        slope = _slope_per_day([(p["start"], p["mean"]) for p in series])
+        if slope is None:
+            direction = "Insufficient Data"
+        elif abs(slope) < STABLE_SLOPE:
+            direction = "Stable"
+        else:
+            direction = "Increasing" if slope > 0 else "Decreasing"
+
+        return {
+            "farm_id": farm_id,
+            "metric": metric,
+            "granularity": granularity,
+            "window": window,
+            "series": series,
+            "slope_per_day": slope,
+            "direction": direction,
+            "window_stats": _summarize([r[1:] for r in rows]),
+            "seasonal_change": self.seasonal_change(farm_id, metric, now),
+        }
+
+    def seasonal_change(self, farm_id, metric, now=None):
+        """Current season's mean vs. the same season one year earlier."""
+        now = time.time() if now is None else now
+        this_season = season_start(now)
+        last_year = datetime.fromtimestamp(this_season, timezone.utc)
+        last_year = int(last_year.replace(year=last_year.year - 1).timestamp())
+        rows = {
+            r[0]: r for r in self._db().execute(
+                "SELECT bucket, count, sum FROM rollups "
+                "WHERE farm_id = ? AND metric = ? AND granularity = 'season' "
+                "AND bucket IN (?, ?)", (farm_id, metric, this_season, last_year)
+            )
+        }
+        current = rows[this_season][2] / rows[this_season][1] if this_season in rows else None
+        previous = rows[last_year][2] / rows[last_year][1] if last_year in rows else None
+        return {
+            "season_start": this_season,
+            "mean": current,
+            "last_year_mean": previous,
+            "change": current - previous if current is not None and previous is not None else None,
+        }
+
+    def clear(self):
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM rollups")
@@ -0,0 +1,190 @@
+import os
+import re
+import sys
+import json
+import logging
+
+from advice_rules import ADVICE_RULES, TEMPLATES, compile_template, render_advice
+
+# -------------------------------------------------
+# REPORT TEMPLATES + PRE-TRANSLATED CATALOG
+# -------------------------------------------------
+# The deterministic report is assembled from fixed templates: the report
+# scaffolding below plus the advice templates in advice_rules. Running
+#
+#     python translations.py build
+#
+# asks Gemini once per language to translate every template (placeholders
+# preserved) and writes CATALOG_PATH (render.yaml runs it at deploy time).
+# /translate then assembles reports locally in the target language and only
+# calls the LLM for free-form text; without a catalog it translates it all.
+
+SUPPORTED_LANGUAGES = ("Hindi", "Telugu", "Tamil", "Kannada")
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "catalog", "advice_catalog.json")
+
+REPORT_TEMPLATES = {
+    "report_heading": "## Soil Health Risk Score: {shrs}/100",
+    "report_risks": "**Environmental Risk:** {env_risk} | **Practice Risk:** {practice_risk}",
+    "report_trend": "📈 **Trend:** {trend}",
+    "report_warning": "🚨 **Warning:** {warning}",
+    "report_recommendations": "### Recommendations",
+    "escalation_irrigation": "Irrigation frequency increased ({previous} → {current}) "
+                             "— monitor water usage and soil saturation.",
+    "escalation_fertilizer": "Fertilizer application intensified ({previous} → {current}) "
+                             "— watch for nutrient runoff and salt buildup.",
+    "trend_increasing": "Increasing Risk",
+    "trend_decreasing": "Decreasing Risk",
+    "trend_stable": "Stable",
+    "trend_insufficient": "Insufficient Data",
+}
+TREND_KEYS = {
+    "Increasing Risk": "trend_increasing",
+    "Decreasing Risk": "trend_decreasing",
+    "Stable": "trend_stable",
+    "Insufficient Data": "trend_insufficient",
+}
+
+# Every template that goes into the catalog, in source (English) form
+SOURCE_TEMPLATES = dict(REPORT_TEMPLATES)
+SOURCE_TEMPLATES.update(
+    (rule_id, text)
+    for rules in ADVICE_RULES.values()
+    for rule_id, _, text in rules
+)
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+def placeholders(text):
+    return set(_PLACEHOLDER.findall(text))
+
+
+def format_escalation(escalation, templates=REPORT_TEMPLATES):
+    """{"practice", "previous", "current"} → warning sentence."""
+    return templates[f"escalation_{escalation['practice']}"].format(
+        previous=escalation["previous"], current=escalation["current"])
+
+
+def load_catalog(path=CATALOG_PATH):
+    """Catalog JSON → {language: {template id: template}}; advice pre-parsed."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Translation catalog unreadable ({path}): {e}")
+        return {}
+
+    catalog = {}
+    for language, entries in raw.items():
+        compiled = {}
+        for key, text in entries.items():
+            if key not in SOURCE_TEMPLATES or placeholders(text) != placeholders(SOURCE_TEMPLATES[key]):
+                continue
+            if key in TEMPLATES:
+                try:
+                    text = compile_template(text)
+                except ValueError:
+                    continue
+            compiled[key] = text
+        catalog[language] = compiled
+    return catalog
+
+
+def build_report(report, templates=REPORT_TEMPLATES, advice_templates=TEMPLATES):
+    """Assemble the deterministic markdown report from its structured form.
+
+    `report` holds shrs, env_risk, practice_risk, trend, escalations,
+    advice (rule ids) and values (sensor averages). Returns None when a
+    needed template is missing (e.g. partial catalog).
+    """
+    try:
+        trend = templates[TREND_KEYS[report["trend"]]]
+        lines = [
+            templates["report_heading"].format(shrs=report["shrs"]),
+            templates["report_risks"].format(
+                env_risk=report["env_risk"], practice_risk=report["practice_risk"]),
+            templates["report_trend"].format(trend=trend),
+        ]
+        for escalation in report.get("escalations") or []:
+            lines.append(templates["report_warning"].format(
+                warning=format_escalation(escalation, templates)))
+        lines.append(templates["report_recommendations"])
+        for rule_id in report["advice"]:
+            lines.append("- " + render_advice(advice_templates[rule_id], report["values"]))
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+    return "\n\n".join(lines) + "\n\n"
+
+
+def build_translated_report(report, language, catalog):
+    """Report in `language` from the catalog, or None if anything is missing."""
+    entries = catalog.get(language)
+    if not entries:
+        return None
+    return build_report(report, templates=entries, advice_templates=entries)
+
+
+# -------------------------------------------------
+# BUILD STEP
+# -------------------------------------------------
+def translate_templates(client, language, model="gemini-2.0-flash"):
+    """Ask Gemini for every template in `language`; keep those that survive."""
+    prompt = f"""Translate the values of this JSON object into {language}.
+
+Rules:
+- Return a JSON object with exactly the same keys
+- Keep every placeholder in curly braces (e.g. {{avg_ph}}) exactly as written
+- Keep markdown markers (**, ##, ###) and emoji in place
+- Keep technical agricultural terms accurate
+
+{json.dumps(SOURCE_TEMPLATES, ensure_ascii=False, indent=2)}"""
+    response = client.models.generate_content(
+        model=model,
+        contents=prompt,
+        config={"response_mime_type": "application/json"}
+    )
+    translated = json.loads(response.candidates[0].content.parts[0].text)
+    kept = {}
+    for key, source in SOURCE_TEMPLATES.items():
+        text = translated.get(key)
+        if isinstance(text, str) and placeholders(text) == placeholders(source):
+            kept[key] = text
+        else:
+            logging.warning(f"{language}: dropping '{key}' (missing or placeholders changed)")
+    return kept
+
+
+def build_catalog(path=CATALOG_PATH, languages=SUPPORTED_LANGUAGES):
+    from dotenv import load_dotenv
+    from google import genai
+
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        # The catalog is optional: /translate falls back to the LLM without it
+        print("GEMINI_API_KEY not set — skipping the translation catalog")
+        return
+    client = genai.Client(api_key=api_key)
+
+    catalog = {}
+    for language in languages:
+        try:
+            catalog[language] = translate_templates(client, language)
+        except Exception as e:
+            logging.warning(f"{language}: translation failed, left out of the catalog: {e}")
+            continue
+        print(f"{language}: {len(catalog[language])}/{len(SOURCE_TEMPLATES)} templates")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        sys.exit("usage: python translations.py build")
+    build_catalog()